@@ -1,13 +1,75 @@
-from fastapi import FastAPI
+import asyncio
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List
+
+from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from typing import List
 
-app = FastAPI(title="Smart Cart API")
+from integrate_scrapers import search_all_products, strip_private_keys
+from superstore import close_superstore
+from walmart2 import close_walmart
+
+# Jobs share the pooled store browsers, but each search still takes a Walmart
+# browser context and waits its turn under the per-store rate limits (Walmart
+# allows one search per ~45s), so extra workers mostly just queue there.
+NUM_WORKERS = 2
+# Finished jobs are kept this long (seconds) for polling, then dropped
+JOB_TTL = 3600
+
 
 class ItemsRequest(BaseModel):
     items: List[str]
 
 
+async def _worker(queue: asyncio.Queue, jobs: Dict[str, Dict[str, Any]]):
+    """Pull queued comparisons and run them, recording the outcome on the job."""
+    while True:
+        req_id, items = await queue.get()
+        job = jobs[req_id]
+        job["status"] = "running"
+        try:
+            results = await search_all_products(items)
+            job["result"] = strip_private_keys(results)
+            job["status"] = "done"
+        except Exception as e:
+            job["status"] = "error"
+            job["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            job["_finished_at"] = time.monotonic()
+            queue.task_done()
+
+
+def _prune_jobs(jobs: Dict[str, Dict[str, Any]]) -> None:
+    """Forget jobs that finished more than JOB_TTL seconds ago."""
+    cutoff = time.monotonic() - JOB_TTL
+    expired = [req_id for req_id, job in jobs.items() if job.get("_finished_at", cutoff) < cutoff]
+    for req_id in expired:
+        del jobs[req_id]
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.queue = asyncio.Queue()
+    app.state.jobs = {}
+    workers = [
+        asyncio.create_task(_worker(app.state.queue, app.state.jobs))
+        for _ in range(NUM_WORKERS)
+    ]
+    try:
+        yield
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        await close_superstore()
+        await close_walmart()
+
+
+app = FastAPI(title="Smart Cart API", lifespan=lifespan)
+
+
 @app.get("/health")
 async def health():
     return {"status": "ok"}
@@ -15,6 +77,18 @@ async def health():
 
 @app.post("/compare")
 async def compare(req: ItemsRequest):
-    # Placeholder: will call scrapers and matching logic in later iterations.
-    # For now, echo the requested items back.
-    return {"status": "queued", "items": req.items}
+    # Scraping takes minutes; queue the job and let the client poll /result/{id}
+    _prune_jobs(app.state.jobs)
+    req_id = uuid.uuid4().hex
+    app.state.jobs[req_id] = {"status": "queued", "items": req.items}
+    await app.state.queue.put((req_id, req.items))
+    return {"status": "queued", "id": req_id}
+
+
+@app.get("/result/{req_id}")
+async def result(req_id: str):
+    _prune_jobs(app.state.jobs)
+    job = app.state.jobs.get(req_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired request id")
+    return {"id": req_id, **{k: v for k, v in job.items() if not k.startswith("_")}}
@@ -4,14 +4,22 @@ Searches for multiple products across both stores and returns results.
 """
 
 import asyncio
+import functools
+import heapq
 import json
 import re
+import time
 from datetime import datetime
-from typing import List, Dict, Any, Set, Optional, Tuple
+from typing import List, Dict, Any, FrozenSet, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Import the scraper functions
-from walmart2 import scrape_walmart_cole_harbour
-from superstore import scrape_superstore
+from walmart2 import close_walmart, scrape_walmart_cole_harbour
+from superstore import close_superstore, scrape_superstore
 
 
 # Products to search for
@@ -21,6 +29,60 @@ PRODUCTS_TO_SEARCH = [
     "Lemons"
 ]
 
+# Cap on products searched at once (each one opens a browser context per store)
+MAX_CONCURRENT_PRODUCTS = 2
+
+# Per-store request budget: (requests, per seconds). Stores are throttled
+# independently so one store's pace never holds back the other. Walmart is
+# not listed: walmart2 enforces its own, much stricter, gap between searches.
+STORE_RATE_LIMITS = {
+    "superstore": (1, 2.0),
+}
+
+
+class _RateLimiter:
+    """Async token bucket allowing `rate` acquisitions per `period` seconds."""
+
+    def __init__(self, rate: int, period: float):
+        self._rate = rate
+        self._period = period
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        # Limiters live at module level, but a lock is tied to the loop it first
+        # waits on; each new asyncio.run() gets a fresh one.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def acquire(self) -> None:
+        """Wait until a token is available, then consume it."""
+        async with self._get_lock():
+            while True:
+                now = time.monotonic()
+                refill = (now - self._updated) * self._rate / self._period
+                self._tokens = min(float(self._rate), self._tokens + refill)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) * self._period / self._rate)
+
+
+_STORE_LIMITERS = {
+    store: _RateLimiter(rate, period) for store, (rate, period) in STORE_RATE_LIMITS.items()
+}
+
+
+async def _throttled(store: str, scrape, product: str) -> List[Dict[str, Any]]:
+    await _STORE_LIMITERS[store].acquire()
+    return await scrape(product)
+
 
 # --- Unit price extraction & normalization ---
 UNIT_CONVERSIONS = {
@@ -44,6 +106,34 @@ UNIT_CONVERSIONS = {
     "rolls": 1,
 }
 
+# Common spellings that should resolve straight to a UNIT_CONVERSIONS key.
+# Exact lookups only: broad words like "pack" must never be substring-matched.
+UNIT_ALIASES = {
+    "liter": "l",
+    "liters": "l",
+    "litre": "l",
+    "litres": "l",
+    "ounce": "oz",
+    "ounces": "oz",
+    "gram": "g",
+    "grams": "g",
+    "pound": "lb",
+    "pounds": "lb",
+    "pc": "piece",
+    "pcs": "piece",
+    "pieces": "piece",
+    "pack": "count",
+}
+
+# Lowercased unit -> UNIT_CONVERSIONS key, so known units skip the fuzzy scan
+_UNIT_INDEX: Dict[str, str] = {}
+for _unit in UNIT_CONVERSIONS:
+    _UNIT_INDEX.setdefault(_unit.lower(), _unit)
+for _alias, _unit in UNIT_ALIASES.items():
+    _UNIT_INDEX.setdefault(_alias, _unit)
+# The fuzzy fallback scans real units only, never aliases
+_UNITS_LONGEST_FIRST = sorted(UNIT_CONVERSIONS, key=len, reverse=True)
+
 PRODUCT_TYPE_KEYWORDS = {
     "milk|juice|beverage|drink|liquid|water|coffee|tea|soda": ("volume", "100ml"),
     "meat|turkey|chicken|beef|pork|deli|ham|bacon|sausage|fish": ("weight", "100g"),
@@ -54,14 +144,36 @@ PRODUCT_TYPE_KEYWORDS = {
     "cereal|pasta|rice|grain|flour": ("weight", "100g"),
 }
 
-
+# Precompiled patterns for the enrichment hot path
+# Unit is letter-runs separated by whitespace, so there is exactly one way to
+# split it from the trailing ",|$" and no lazy-quantifier backtracking
+_QTY_RE = re.compile(r'(\d+(?:\.\d+)?)\s*([A-Za-z]+(?:\s+[A-Za-z]+)*)\s*(?:,|$)')
+_EXPLICIT_RE = re.compile(r'\$(\d+\.?\d*)/(\d+\.?\d*)\s*([a-zA-Z\s]+)')
+
+# All keyword groups fused into one pattern. Each branch is a lookahead so the
+# first group in PRODUCT_TYPE_KEYWORDS order still wins ("orange juice" is a
+# beverage, not produce), and `lastgroup` names the branch that matched.
+_TYPE_RE = re.compile(
+    "^(?:" + "|".join(
+        f"(?=.*?(?:{keywords}))(?P<g{idx}>)"
+        for idx, keywords in enumerate(PRODUCT_TYPE_KEYWORDS)
+    ) + ")",
+    re.DOTALL,
+)
+_TYPE_META = list(PRODUCT_TYPE_KEYWORDS.values())
+_TYPE_TO_DISPLAY: Dict[str, str] = {}
+for _ptype, _display_unit in _TYPE_META:
+    _TYPE_TO_DISPLAY.setdefault(_ptype, _display_unit)
+
+
+@functools.lru_cache(maxsize=2048)
 def _parse_quantity_and_unit(quantity_str: Optional[str]) -> Optional[Tuple[float, str]]:
     """Extract amount and unit from quantity string like '2 L' or '12 Count'."""
-    if not quantity_str or not isinstance(quantity_str, str):
+    if not quantity_str:
         return None
     
     # Pattern: number (with optional spaces) followed by unit
-    match = re.search(r'(\d+\.?\d*)\s*([a-zA-Z\s]+?)(?:\s*,|$)', quantity_str.strip())
+    match = _QTY_RE.search(quantity_str.strip())
     if match:
         try:
             amount = float(match.group(1))
@@ -72,13 +184,14 @@ def _parse_quantity_and_unit(quantity_str: Optional[str]) -> Optional[Tuple[floa
     return None
 
 
+@functools.lru_cache(maxsize=2048)
 def _extract_explicit_unit_price(quantity_str: Optional[str]) -> Optional[Tuple[float, str]]:
     """Extract explicit unit price like '$0.86/100ml' from quantity string."""
-    if not quantity_str or not isinstance(quantity_str, str):
+    if not quantity_str:
         return None
     
     # Pattern: $number/number+unit
-    match = re.search(r'\$(\d+\.?\d*)/(\d+\.?\d*)\s*([a-zA-Z\s]+)', quantity_str.lower())
+    match = _EXPLICIT_RE.search(quantity_str.lower())
     if match:
         try:
             price = float(match.group(1))
@@ -104,12 +217,18 @@ def _calculate_unit_price(total_price: Optional[float], quantity_tuple: Optional
     
     # Normalize unit to base unit
     unit_lower = unit.lower()
+    unit_lower = _UNIT_INDEX.get(unit_lower, unit_lower)
     if unit_lower not in UNIT_CONVERSIONS:
-        # Try fuzzy match
-        for key in UNIT_CONVERSIONS:
-            if key in unit_lower or unit_lower in key:
-                unit_lower = key
-                break
+        # Whole words first, leading one first: "454 g each" is g, "500 g pack" is g
+        match = next((_UNIT_INDEX[t] for t in unit_lower.split() if t in _UNIT_INDEX), None)
+        if match is None:
+            # Try fuzzy match (rare: only units with no known word get here).
+            # Longest known unit wins so "lbbag" is lb, not l, and "kgs" is kg, not g.
+            match = next((u for u in _UNITS_LONGEST_FIRST if u in unit_lower), None)
+        if match is None:
+            match = next((u for u in UNIT_CONVERSIONS if unit_lower in u), None)
+        if match is not None:
+            unit_lower = _UNIT_INDEX.get(match.lower(), match)
         else:
             # Unknown unit, return count-based
             price_per_unit = total_price / amount
@@ -133,69 +252,81 @@ def _calculate_unit_price(total_price: Optional[float], quantity_tuple: Optional
     }
 
 
+@functools.lru_cache(maxsize=4096)
 def _detect_product_type(product_name: str) -> str:
     """Detect product type from name."""
-    name_lower = product_name.lower()
-    for keywords, (ptype, display_unit) in PRODUCT_TYPE_KEYWORDS.items():
-        if re.search(keywords, name_lower):
-            return ptype
+    match = _TYPE_RE.search(product_name.lower())
+    if match:
+        return _TYPE_META[int(match.lastgroup[1:])][0]
     return "unknown"
 
 
 def _get_best_display_unit(product_type: str) -> str:
     """Get best display unit for a product type."""
-    for keywords, (ptype, display_unit) in PRODUCT_TYPE_KEYWORDS.items():
-        if ptype == product_type:
-            return display_unit
-    return "1unit"
+    return _TYPE_TO_DISPLAY.get(product_type, "1unit")
 
 
-def _enrich_unit_prices(item: Dict[str, Any]) -> Dict[str, Any]:
-    """Enrich an item with calculated unit prices."""
-    item_copy = item.copy()
-    
-    price = item_copy.get("price")
-    quantity = item_copy.get("quantity")
+# --- Unit price display formatting, keyed by display unit ---
+def _fmt_per_100(base: float, calc: Dict[str, Any], display_unit: str) -> str:
+    return f"${base * 100:.2f}/{display_unit}"
+
+
+def _fmt_per_lb(base: float, calc: Dict[str, Any], display_unit: str) -> str:
+    # Convert g to lb if needed
+    if calc["base_unit"] == "g":
+        base *= 453.592
+    return f"${base:.2f}/{display_unit}"
+
+
+def _fmt_each(base: float, calc: Dict[str, Any], display_unit: str) -> str:
+    return f"${base:.2f}/{display_unit}"
+
+
+def _fmt_default(base: float, calc: Dict[str, Any], display_unit: str) -> str:
+    return f"${base:.4f}/unit"
+
+
+_DISPLAY_FORMATTERS = {
+    "100ml": _fmt_per_100,
+    "100g": _fmt_per_100,
+    "lb": _fmt_per_lb,
+    "1ea": _fmt_each,
+    "1roll": _fmt_each,
+}
+
+
+def _enrich_unit_prices(item: Dict[str, Any]) -> None:
+    """Enrich an item in place with calculated unit prices."""
+    price = item.get("price")
+    quantity = item.get("quantity")
     
     # Try to extract explicit unit price from quantity field first
     explicit = _extract_explicit_unit_price(quantity)
     if explicit:
         explicit_price, explicit_unit = explicit
-        item_copy["unit_price_display"] = f"${explicit_price:.2f}/{explicit_unit}"
-        item_copy["unit_prices"] = [{"amount": explicit_price, "per": explicit_unit}]
-        return item_copy
+        item["unit_price_display"] = f"${explicit_price:.2f}/{explicit_unit}"
+        item["unit_prices"] = [{"amount": explicit_price, "per": explicit_unit}]
+        return
     
     # Parse quantity and calculate
     qty_tuple = _parse_quantity_and_unit(quantity)
     if qty_tuple and price is not None:
         calc = _calculate_unit_price(price, qty_tuple)
         if calc:
-            item_copy["unit_prices"] = [calc]
+            item["unit_prices"] = [calc]
             # Choose display format based on product type
-            product_type = _detect_product_type(item_copy.get("name", ""))
+            name_lower = item.get("_name_lower")
+            if name_lower is None:
+                name_lower = (item.get("name") or "").lower()
+            product_type = _detect_product_type(name_lower)
             display_unit = _get_best_display_unit(product_type)
             
             # Calculate price for display unit
             if "normalized_amount" in calc:
-                base = calc["normalized_amount"]
-                if "100ml" in display_unit or "100g" in display_unit:
-                    display_price = base * 100
-                    item_copy["unit_price_display"] = f"${display_price:.2f}/{display_unit}"
-                elif "lb" in display_unit:
-                    # Convert g to lb if needed
-                    if calc["base_unit"] == "g":
-                        display_price = base * 453.592
-                        item_copy["unit_price_display"] = f"${display_price:.2f}/{display_unit}"
-                    else:
-                        item_copy["unit_price_display"] = f"${base:.2f}/{display_unit}"
-                elif "1ea" in display_unit or "1roll" in display_unit:
-                    item_copy["unit_price_display"] = f"${base:.2f}/{display_unit}"
-                else:
-                    item_copy["unit_price_display"] = f"${base:.4f}/unit"
+                fmt = _DISPLAY_FORMATTERS.get(display_unit, _fmt_default)
+                item["unit_price_display"] = fmt(calc["normalized_amount"], calc, display_unit)
             else:
-                item_copy["unit_price_display"] = f"${calc['amount']:.2f}/{calc['per']}"
-    
-    return item_copy
+                item["unit_price_display"] = f"${calc['amount']:.2f}/{calc['per']}"
 
 
 # --- Relevance filtering (no category data available) ---
@@ -210,37 +341,61 @@ NEGATIVE_TERMS = {
     "ebook",
     "ornament",
 }
+_TOKEN_RE = re.compile(r"[^\s%]*%|[^\s%]+")
+_NEGATIVE_RE = re.compile("|".join(re.escape(term) for term in NEGATIVE_TERMS))
 
 
-def _tokenize(text: str) -> Set[str]:
-    return {t for t in text.lower().replace("%", "% ").split() if t}
+def _tokenize(text: str) -> FrozenSet[str]:
+    # A "%" ends the token it is attached to: "2%milk" -> {"2%", "milk"}
+    return frozenset(_TOKEN_RE.findall(text.lower()))
 
 
-def _is_relevant(query: str, item: Dict[str, Any]) -> bool:
-    # Require at least 50% of query tokens to appear in the combined text
-    q_tokens = _tokenize(query)
+def _cache_match_text(item: Dict[str, Any]) -> None:
+    """Normalize an incoming item and attach lowercased match text (stripped before saving)."""
+    if "_combined" in item:
+        return
+    # Scrapers report quantity as str or None; enforce it here so the cached
+    # quantity parsers downstream can skip their own type checks
+    if not isinstance(item.get("quantity"), str):
+        item["quantity"] = None
     name = item.get("name") or ""
     quantity = item.get("quantity") or ""
     unit_price = item.get("unit_price") or ""
-    combined = f"{name} {quantity} {unit_price}".lower()
+    item["_name_lower"] = name.lower()
+    item["_combined"] = f"{name} {quantity} {unit_price}".lower()
+
+
+def _is_relevant(q_tokens: FrozenSet[str], min_required: int, item: Dict[str, Any]) -> bool:
+    # Query tokens and threshold are computed once per query by the caller
+    combined = item["_combined"]
 
     # Negative term gate
-    if any(neg in combined for neg in NEGATIVE_TERMS):
+    if _NEGATIVE_RE.search(combined):
         return False
 
-    # Match at least 50% of tokens (or minimum 2, whichever is lower)
-    match_count = sum(1 for token in q_tokens if token in combined)
-    min_required = max(2, len(q_tokens) // 2)
-    return match_count >= min_required
+    # Stop scanning as soon as enough tokens have matched
+    match_count = 0
+    for token in q_tokens:
+        if token in combined:
+            match_count += 1
+            if match_count >= min_required:
+                return True
+    return False
 
 
 def _filter_and_rank(query: str, items: List[Dict[str, Any]], limit: int = 10) -> List[Dict[str, Any]]:
-    filtered = [itm for itm in items if _is_relevant(query, itm)]
-    # Prefer items with a numeric price present
-    filtered.sort(key=lambda x: (x.get("price") is None, x.get("price", 0)))
-    # Enrich with unit prices
-    enriched = [_enrich_unit_prices(itm) for itm in filtered[:limit]]
-    return enriched
+    q_tokens = _tokenize(query)
+    # Match at least 50% of tokens (or minimum 2, whichever is higher)
+    min_required = max(2, len(q_tokens) // 2)
+    for itm in items:
+        _cache_match_text(itm)
+    filtered = [itm for itm in items if _is_relevant(q_tokens, min_required, itm)]
+    # Prefer items with a numeric price present; partial sort, only `limit` are kept
+    top = heapq.nsmallest(limit, filtered, key=lambda x: (x.get("price") is None, x.get("price") or 0.0))
+    # Enrich with unit prices (items are fresh scraper output, safe to mutate)
+    for itm in top:
+        _enrich_unit_prices(itm)
+    return top
 
 
 def _find_cheapest_option(product_name: str, stores_dict: Dict[str, List[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
@@ -251,55 +406,84 @@ def _find_cheapest_option(product_name: str, stores_dict: Dict[str, List[Dict[st
     Returns:
         {"store": "Walmart", "item": {...}} or None if no valid items
     """
-    all_items = []
-    
-    # Collect all items from all stores with store labels
+    # Track the best entry for each comparison mode in a single pass;
+    # strict < keeps the first of equal candidates.
+    best_unit = None   # (sort_key, store, item)
+    best_total = None
+
     for store_name, items in stores_dict.items():
         for item in items:
-            if item.get("price") is not None:  # Only consider items with prices
-                all_items.append({
-                    "store": store_name,
-                    "item": item
-                })
-    
-    if not all_items:
-        return None
-    
-    # Try to find cheapest by normalized unit price first (fairest comparison)
-    items_with_normalized = []
-    for entry in all_items:
-        unit_prices = entry["item"].get("unit_prices", [])
-        if unit_prices and isinstance(unit_prices, list) and len(unit_prices) > 0:
-            normalized = unit_prices[0].get("normalized_amount")
-            if normalized is not None:
-                items_with_normalized.append({
-                    "store": entry["store"],
-                    "item": entry["item"],
-                    "normalized_price": normalized
-                })
-    
-    # If we have items with normalized unit prices, use those for comparison
-    if items_with_normalized:
-        # Prefer available items, then by normalized unit price
-        items_with_normalized.sort(key=lambda x: (
-            not x["item"].get("available", False),  # Available items first
-            x["normalized_price"]
-        ))
-        best = items_with_normalized[0]
-        return {"store": best["store"], "item": best["item"], "comparison_type": "unit_price"}
-    
-    # Fall back to total price comparison
-    all_items.sort(key=lambda x: (
-        not x["item"].get("available", False),  # Available items first
-        x["item"].get("price", float('inf'))
-    ))
-    
-    return {"store": all_items[0]["store"], "item": all_items[0]["item"], "comparison_type": "total_price"}
+            price = item.get("price")
+            if price is None:  # Only consider items with prices
+                continue
+            unavailable = not item.get("available", False)  # Available items first
+
+            total_key = (unavailable, price)
+            if best_total is None or total_key < best_total[0]:
+                best_total = (total_key, store_name, item)
+
+            # Normalized unit price is the fairest comparison when present
+            unit_prices = item.get("unit_prices")
+            if unit_prices and isinstance(unit_prices, list):
+                normalized = unit_prices[0].get("normalized_amount")
+                if normalized is not None:
+                    unit_key = (unavailable, normalized)
+                    if best_unit is None or unit_key < best_unit[0]:
+                        best_unit = (unit_key, store_name, item)
+
+    if best_unit is not None:
+        return {"store": best_unit[1], "item": best_unit[2], "comparison_type": "unit_price"}
+    if best_total is not None:
+        return {"store": best_total[1], "item": best_total[2], "comparison_type": "total_price"}
+    return None
 
 
-async def search_all_products() -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+async def _search_product(product: str, semaphore: asyncio.Semaphore) -> Dict[str, List[Dict[str, Any]]]:
+    """Search one product at both stores concurrently."""
+    async with semaphore:
+        print(f"\n{'='*80}")
+        print(f"Searching for: {product}")
+        print(f"{'='*80}")
+
+        print(f"\n[SUPERSTORE] Searching for '{product}'...")
+        print(f"\n[WALMART] Searching for '{product}'...")
+        superstore_items, walmart_items = await asyncio.gather(
+            _throttled("superstore", scrape_superstore, product),
+            scrape_walmart_cole_harbour(product),
+            return_exceptions=True,
+        )
+
+        stores = {
+            "walmart": [],
+            "superstore": []
+        }
+
+        # BaseException, not Exception: a cancelled store search comes back as a
+        # CancelledError, which must not be treated as an item list
+        if isinstance(superstore_items, BaseException):
+            print(f"[SUPERSTORE] Error: {type(superstore_items).__name__}: {superstore_items}")
+        else:
+            stores["superstore"] = _filter_and_rank(product, superstore_items)
+            print(f"[SUPERSTORE] Found {len(superstore_items)} items | kept {len(stores['superstore'])} relevant")
+
+        if isinstance(walmart_items, BaseException):
+            print(f"[WALMART] Error (may require manual captcha): {type(walmart_items).__name__}: {walmart_items}")
+        else:
+            stores["walmart"] = _filter_and_rank(product, walmart_items)
+            print(f"[WALMART] Found {len(walmart_items)} items | kept {len(stores['walmart'])} relevant")
+
+        return stores
+
+
+async def search_all_products(products: Optional[List[str]] = None) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
     """
     Search for all products across both stores.
+
+    Args:
+        products: Product names to search for; defaults to PRODUCTS_TO_SEARCH.
+
+    Stores are queried concurrently for each product, and up to
+    MAX_CONCURRENT_PRODUCTS products are in flight at once.
     
     Returns:
         {
@@ -310,43 +494,13 @@ async def search_all_products() -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
             ...
         }
     """
-    results = {}
-    
-    for product in PRODUCTS_TO_SEARCH:
-        print(f"\n{'='*80}")
-        print(f"Searching for: {product}")
-        print(f"{'='*80}")
-        
-        results[product] = {
-            "walmart": [],
-            "superstore": []
-        }
-        
-        # Search Superstore
-        print(f"\n[SUPERSTORE] Searching for '{product}'...")
-        try:
-            superstore_items = await scrape_superstore(product)
-            filtered_superstore = _filter_and_rank(product, superstore_items)
-            results[product]["superstore"] = filtered_superstore
-            print(f"[SUPERSTORE] Found {len(superstore_items)} items | kept {len(filtered_superstore)} relevant")
-        except Exception as e:
-            print(f"[SUPERSTORE] Error: {e}")
-            results[product]["superstore"] = []
-        
-        # Search Walmart
-        print(f"\n[WALMART] Searching for '{product}'...")
-        try:
-            walmart_items = await scrape_walmart_cole_harbour(product)
-            filtered_walmart = _filter_and_rank(product, walmart_items)
-            results[product]["walmart"] = filtered_walmart
-            print(f"[WALMART] Found {len(walmart_items)} items | kept {len(filtered_walmart)} relevant")
-        except Exception as e:
-            print(f"[WALMART] Error (may require manual captcha): {type(e).__name__}: {e}")
-            results[product]["walmart"] = []
-        
-        await asyncio.sleep(2)  # Small delay between searches
-    
-    return results
+    if products is None:
+        products = PRODUCTS_TO_SEARCH
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_PRODUCTS)
+    per_product = await asyncio.gather(
+        *(_search_product(product, semaphore) for product in products)
+    )
+    return dict(zip(products, per_product))
 
 
 def print_comparison(results: Dict[str, Dict[str, List[Dict[str, Any]]]]) -> None:
@@ -419,12 +573,32 @@ def print_comparison(results: Dict[str, Dict[str, List[Dict[str, Any]]]]) -> Non
         print()
 
 
-def save_results(results: Dict[str, Dict[str, List[Dict[str, Any]]]]) -> None:
-    """Save results to JSON file."""
+def strip_private_keys(results: Dict[str, Dict[str, List[Dict[str, Any]]]]) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+    """Drop underscore-prefixed working keys (e.g. `_combined`) from every item."""
+    return {
+        product: {
+            store: [{k: v for k, v in item.items() if not k.startswith("_")} for item in items]
+            for store, items in stores.items()
+        }
+        for product, stores in results.items()
+    }
+
+
+def _write_results_file(results: Dict[str, Dict[str, List[Dict[str, Any]]]], output_file: str) -> None:
+    cleaned = strip_private_keys(results)
+    if orjson is not None:
+        with open(output_file, "wb") as f:
+            f.write(orjson.dumps(cleaned, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+        return
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump(cleaned, f, indent=2, ensure_ascii=False)
+
+
+async def save_results(results: Dict[str, Dict[str, List[Dict[str, Any]]]]) -> None:
+    """Save results to JSON file without blocking the event loop."""
     output_file = f"comparison_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
     
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
+    await asyncio.to_thread(_write_results_file, results, output_file)
     
     print(f"\nResults saved to: {output_file}")
 
@@ -438,7 +612,7 @@ async def main():
     try:
         results = await search_all_products()
         print_comparison(results)
-        save_results(results)
+        await save_results(results)
         
     except KeyboardInterrupt:
         print("\n\nScraping interrupted by user.")
@@ -446,6 +620,9 @@ async def main():
         print(f"\n\nFatal error: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        await close_superstore()
+        await close_walmart()
 
 
 if __name__ == "__main__":
@@ -1,16 +1,31 @@
 import asyncio
+import functools
 import json
+import logging
+import os
 import re
-import traceback
+import tempfile
+import time
+from contextlib import asynccontextmanager, suppress
+from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 from urllib.parse import quote_plus
 
+import aiohttp
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 from playwright.async_api import async_playwright
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+log = logging.getLogger(__name__)
+
 try:
     from playwright_stealth import stealth_async
 except ImportError:
-    print("Please install playwright-stealth: pip install playwright-stealth")
+    log.warning("Please install playwright-stealth: pip install playwright-stealth")
     stealth_async = None
 
 USER_AGENT = (
@@ -21,16 +36,181 @@ USER_AGENT = (
 # Default postal code for Cole Harbour, NS
 DEFAULT_POSTAL_CODE = "B2V2J5"
 
+# Set SOBEYS_DEBUG=1 to dump the raw page data and per-item debug records to disk
+DEBUG = os.environ.get("SOBEYS_DEBUG") == "1"
+
+# Cookies + localStorage (postal code, consent) survive restarts here, like the Walmart session
+SESSION_DIR = Path(__file__).parent / ".sobeys_sessions"
+
+# Headless by default; set SOBEYS_HEADFUL=1 to get a visible window for solving captchas
+HEADLESS = os.environ.get("SOBEYS_HEADFUL") != "1"
+LAUNCH_ARGS = [
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--no-sandbox",
+    "--disable-background-networking",
+    "--disable-features=TranslateUI,BackForwardCache",
+    "--blink-settings=imagesEnabled=false",
+]
+
+# Only the document and its scripts are needed to get at the product JSON
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "font", "media", "stylesheet"})
+
+_CURRENCY_RE = re.compile(r"[^0-9.,]")
+_PRICING_KEYS = ("price", "salePrice", "regularPrice", "current", "amount", "value", "list")
+_ITEM_PRICE_KEYS = ("price", "regularPrice")
+_ID_KEYS = ("sku", "id", "productId", "code", "gtin", "upc")
+
+_AVAIL_RE = re.compile(r"in stock|available|add to cart", re.IGNORECASE)
+_AVAILABILITY_FIELDS = (
+    "availabilityStatus",
+    "availability",
+    "availabilityMessage",
+    "availabilityText",
+    "inventoryStatus",
+)
+_AVAILABILITY_FLAGS = ("isAvailable", "available", "buyable", "canAddToCart", "sellable")
+_OOS_STATUSES = frozenset(("OUT_OF_STOCK", "SOLD_OUT", "UNAVAILABLE"))
+
+_SEARCH_DATA_PATH = ("props", "pageProps", "initialSearchData")
+
+PRICE_KEYS = frozenset(("price", "pricing", "prices", "regularPrice"))
+PRODUCT_TYPES = frozenset(("Product", "SellableProduct"))
+
+NEXT_DATA_RE = re.compile(rb'<script[^>]*id="__NEXT_DATA__"[^>]*>(.*?)</script>', re.DOTALL)
+
+# Only the top of the page is needed to spot block / not-found messages
+PAGE_TEXT_JS = "() => (document.body ? document.body.innerText.slice(0, 4000) : '').toLowerCase()"
+DATA_SCRIPT_JS = """() => {
+    const tag = document.getElementById('__NEXT_DATA__')
+        || document.querySelector('script[type="application/json"]');
+    return tag ? tag.textContent : '';
+}"""
+
+# Modal selectors are unioned so each lookup is one auto-waiting locator call
+COOKIE_SEL = ", ".join([
+    'button:has-text("Accept")',
+    'button:has-text("Accept All")',
+    'button:has-text("I Accept")',
+    'button:has-text("Agree")',
+    '[id*="accept"]',
+    '[class*="accept"]',
+    'button[aria-label*="Accept"]',
+])
+LOCATION_INPUT_SEL = ", ".join([
+    'input[placeholder*="postal" i]',
+    'input[type="text"][name*="postal"]',
+])
+SUBMIT_SEL = ", ".join([
+    'button:has-text("Submit")',
+    'button:has-text("Confirm")',
+    'button:has-text("Set")',
+    'button[type="submit"]',
+])
+CLOSE_SEL = ", ".join([
+    'button:has-text("Skip")',
+    'button:has-text("Close")',
+    'button:has-text("Not Now")',
+    '[aria-label*="Close"]',
+    '[class*="close"]',
+])
+
+BLOCKED_PHRASES = (
+    "verify you are human",
+    "press & hold",
+    "access to this page has been denied",
+    "unusual traffic",
+)
+_BLOCKED_RE = re.compile("|".join(map(re.escape, BLOCKED_PHRASES)).encode(), re.IGNORECASE)
+
+# After Sobeys refuses the plain-HTTP probe, go straight to the browser for this
+# many seconds instead of repeating a request that is already flagged.
+HTTP_REFUSAL_COOLDOWN = 600
+
+
+def _loads(raw: Any) -> Any:
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
 
+def _dump_json_file(obj: Any, path: str) -> None:
+    if orjson is not None:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=2, ensure_ascii=False)
+
+
+def _read_session(path: Path) -> Optional[Dict[str, Any]]:
+    """Saved storage state, or None when it is missing or unreadable."""
+    try:
+        state = _loads(path.read_bytes())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        log.warning("Ignoring unreadable Sobeys session %s: %s", path.name, e)
+        return None
+    return state if isinstance(state, dict) else None
+
+
+def _write_session(path: Path, state: Dict[str, Any]) -> None:
+    """Write storage state via a temp file and rename, so readers never see half a file."""
+    path.parent.mkdir(exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(orjson.dumps(state) if orjson is not None else json.dumps(state).encode())
+        os.replace(tmp, path)
+    except BaseException:
+        with suppress(OSError):
+            os.unlink(tmp)
+        raise
+
+
+def _write_debug_file(path: str, data: Any) -> None:
+    if isinstance(data, str):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(data)
+    else:
+        _dump_json_file(data, path)
+
+
+async def _debug_dump(path: str, data: Any) -> None:
+    """Write a debug artifact off the event loop; no-op unless DEBUG is set."""
+    if not DEBUG:
+        return
+    try:
+        await asyncio.to_thread(_write_debug_file, path, data)
+        log.debug("Wrote %s for inspection.", path)
+    except Exception as e:
+        log.debug("Failed to write %s: %s", path, e)
+
+
+# Price strings like "$4.99" repeat heavily within and across searches
+@functools.lru_cache(maxsize=2048)
 def _strip_currency(val: str) -> Optional[float]:
-    cleaned = re.sub(r"[^0-9.,]", "", val)
-    cleaned = cleaned.replace(",", "").strip()
+    # Plain "3.99" style strings skip the regex pass entirely
+    if val.isascii() and val.replace(".", "", 1).isdigit():
+        return float(val)
+    cleaned = _CURRENCY_RE.sub("", val).replace(",", "")
     try:
         return float(cleaned)
-    except Exception:
+    except ValueError:
         return None
 
 
+def _first_price(d: Dict[str, Any], keys: Tuple[str, ...] = _PRICING_KEYS) -> Optional[float]:
+    """First value under `keys` that normalizes to a price."""
+    for key in keys:
+        if key in d:
+            price = _normalize_price(d[key])
+            if price is not None:
+                return price
+    return None
+
+
 def _normalize_price(v: Any) -> Optional[float]:
     if v is None:
         return None
@@ -39,19 +219,7 @@ def _normalize_price(v: Any) -> Optional[float]:
     if isinstance(v, str):
         return _strip_currency(v)
     if isinstance(v, dict):
-        for key in (
-            "price",
-            "salePrice",
-            "regularPrice",
-            "current",
-            "amount",
-            "value",
-            "list",
-        ):
-            if key in v:
-                maybe = _normalize_price(v.get(key))
-                if maybe is not None:
-                    return maybe
+        return _first_price(v)
     return None
 
 
@@ -71,25 +239,11 @@ def _extract_price_fields(item: Dict[str, Any]) -> Tuple[Optional[float], Option
 
     pricing = item.get("pricing") or item.get("price") or item.get("prices")
     if isinstance(pricing, dict):
-        for key in (
-            "price",
-            "salePrice",
-            "regularPrice",
-            "current",
-            "amount",
-            "value",
-            "list",
-        ):
-            if price is None and key in pricing:
-                price = _normalize_price(pricing.get(key))
-        if unit_price is None:
-            unit_price = _extract_unit_price(pricing)
-
-    if price is None and "price" in item:
-        price = _normalize_price(item.get("price"))
+        price = _first_price(pricing)
+        unit_price = _extract_unit_price(pricing)
 
-    if price is None and "regularPrice" in item:
-        price = _normalize_price(item.get("regularPrice"))
+    if price is None:
+        price = _first_price(item, _ITEM_PRICE_KEYS)
 
     if unit_price is None:
         unit_price = _extract_unit_price(item)
@@ -97,407 +251,618 @@ def _extract_price_fields(item: Dict[str, Any]) -> Tuple[Optional[float], Option
     return price, unit_price
 
 
-def _is_available(item: Dict[str, Any]) -> bool:
-    availability_fields = (
-        item.get("availabilityStatus"),
-        item.get("availability"),
-        item.get("availabilityMessage"),
-        item.get("availabilityText"),
-        item.get("inventoryStatus"),
-    )
-    for val in availability_fields:
-        if isinstance(val, str) and any(
-            kw in val.lower()
-            for kw in ("in stock", "available", "add to cart", "available online")
-        ):
+def _is_available(item: Dict[str, Any], price: Optional[float]) -> bool:
+    for key in _AVAILABILITY_FIELDS:
+        val = item.get(key)
+        if isinstance(val, str) and _AVAIL_RE.search(val):
             return True
 
-    flags = (
-        item.get("isAvailable"),
-        item.get("available"),
-        item.get("buyable"),
-        item.get("canAddToCart"),
-        item.get("sellable"),
-    )
-    if any(flag is True for flag in flags):
-        return True
+    for key in _AVAILABILITY_FLAGS:
+        if item.get(key) is True:
+            return True
 
-    price, _ = _extract_price_fields(item)
     status = item.get("availabilityStatus") or item.get("inventoryStatus")
-    if price is not None and not (
-        isinstance(status, str)
-        and status.upper() in ("OUT_OF_STOCK", "SOLD_OUT", "UNAVAILABLE")
-    ):
+    if price is not None and not (isinstance(status, str) and status.upper() in _OOS_STATUSES):
         return True
     return False
 
 
 def _collect_products(tree: Any) -> List[Dict[str, Any]]:
     found: List[Dict[str, Any]] = []
-
-    def walk(node: Any):
-        if isinstance(node, dict):
-            looks_like_product = False
-            if node.get("__typename") in ("Product", "SellableProduct"):
-                looks_like_product = True
-            if isinstance(node.get("name"), str) and any(
-                key in node for key in ("price", "pricing", "prices", "regularPrice")
-            ):
-                looks_like_product = True
-            if isinstance(node.get("title"), str) and any(
-                key in node for key in ("price", "pricing", "prices", "regularPrice")
+    stack: List[Any] = [tree]
+    pop = stack.pop
+    extend = stack.extend
+
+    # Children are pushed reversed so nodes come out in the same pre-order
+    # the old recursive walk produced (first occurrence wins during dedup).
+    while stack:
+        node = pop()
+        t = type(node)
+        if t is dict:
+            if node.get("__typename") in PRODUCT_TYPES or (
+                (isinstance(node.get("name"), str) or isinstance(node.get("title"), str))
+                and not PRICE_KEYS.isdisjoint(node)
             ):
-                looks_like_product = True
-            if looks_like_product:
                 found.append(node)
-            for v in node.values():
-                walk(v)
-        elif isinstance(node, list):
-            for v in node:
-                walk(v)
-
-    walk(tree)
+            extend(reversed(node.values()))
+        elif t is list:
+            extend(reversed(node))
     return found
 
 
-def _unique_identifier(item: Dict[str, Any]) -> str:
-    for key in ("sku", "id", "productId", "code", "gtin", "upc"):
-        if key in item and item.get(key):
-            return str(item.get(key))
-    name = item.get("name") or item.get("title") or "unknown"
-    return str(name)
+def _process_item(
+    item: Dict[str, Any], results_by_pid: Dict[str, Dict[str, Any]]
+) -> Optional[Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]]]:
+    """Visit one product once: identify, dedup, price and check availability."""
+    name = item.get("name") or item.get("title")
+    if not isinstance(name, str):
+        return None
 
+    # Items with neither an id nor a usable name can't be told apart; drop them
+    pid: Optional[str] = name or None
+    for key in _ID_KEYS:
+        v = item.get(key)
+        if v:
+            pid = str(v)
+            break
+    if pid is None or pid in results_by_pid:
+        return None
 
-async def scrape_sobeys(search_term: str, postal_code: str = DEFAULT_POSTAL_CODE) -> List[Dict[str, Any]]:
+    price, unit_price = _extract_price_fields(item)
+    record = {
+        "name": name,
+        "price": price,
+        "unit_price": unit_price,
+        "available": _is_available(item, price),
+    }
+    if not DEBUG:
+        return pid, record, None
+    debug_record = {
+        "id": pid,
+        "name": name,
+        "has_price": price is not None,
+        "unit_price": unit_price,
+        "availabilityStatus": item.get("availabilityStatus") or item.get("inventoryStatus"),
+        "keys": sorted(item),
+    }
+    return pid, record, debug_record
+
+
+def _search_subtree(script_data: Any) -> Any:
+    """Narrow the Next.js blob to the search results, or None if the shape differs."""
+    node = script_data
+    for key in _SEARCH_DATA_PATH:
+        if not isinstance(node, dict):
+            return None
+        node = node.get(key)
+    return node
+
+
+def _build_results(script_data: Any) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Return (results, debug records); debug records are only built when DEBUG is set."""
+    # Walking only the search subtree skips the layout/i18n bulk of the blob;
+    # fall back to the whole tree if the schema drifts.
+    subtree = _search_subtree(script_data)
+    products = _collect_products(subtree) if subtree is not None else []
+    if not products:
+        products = _collect_products(script_data)
+    results_by_pid: Dict[str, Dict[str, Any]] = {}
+    debug: List[Dict[str, Any]] = []
+
+    debug_append = debug.append
+    for item in products:
+        processed = _process_item(item, results_by_pid)
+        if processed is None:
+            continue
+        pid, record, debug_record = processed
+        results_by_pid[pid] = record
+        if debug_record is not None:
+            debug_append(debug_record)
+
+    results = list(results_by_pid.values())
+    log.info("Sobeys: extracted %d items (unique by id/name).", len(results))
+    return results, debug
+
+
+async def _block_assets(route) -> None:
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+def _postal_init_script(postal_code: str) -> str:
+    # Runs before any page script on every document, so the search page
+    # sees the postal code on its very first load.
+    return f"""
+        try {{
+            if (location.hostname.endsWith('sobeys.com')) {{
+                localStorage.setItem('postalCode', '{postal_code}');
+                localStorage.setItem('preferredPostal', '{postal_code}');
+                localStorage.setItem('sobeys_postal_code', '{postal_code}');
+            }}
+        }} catch(e) {{}}
     """
-    Best-effort Sobeys search scraper using Playwright.
-    Returns list of {name, price, unit_price, available}.
+
+
+async def _wait_for_next_data(page, timeout: int) -> bool:
+    try:
+        await page.wait_for_selector("script#__NEXT_DATA__", state="attached", timeout=timeout)
+        return True
+    except Exception:
+        return False
+
+
+async def _try_click(page, selector: str, timeout: int = 1500) -> bool:
+    """Click the first match of a (comma-joined) selector if it is on screen now.
+
+    is_visible() answers immediately, so a page without the modal costs one
+    round trip instead of a full click timeout.
     """
+    locator = page.locator(selector).first
+    if not await locator.is_visible():
+        return False
+    try:
+        await locator.click(timeout=timeout)
+        return True
+    except PlaywrightTimeoutError:
+        return False
+
+
+# Queue markers. _RETIRED wakes callers waiting on a dead browser's queue so
+# they move to the relaunched one; _CLOSED fails them after close(). Both are
+# put back after being read so every waiter sees them. _SLOT_FREED tells one
+# waiter that a context was dropped and it may open a new one.
+_RETIRED = object()
+_CLOSED = object()
+_SLOT_FREED = object()
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=False)
-        context = await browser.new_context(
-            user_agent=USER_AGENT,
-            viewport={"width": 1280, "height": 800},
-            device_scale_factor=1,
-            extra_http_headers={
+
+class SobeysBrowserPool:
+    """
+    Keeps one Chromium instance and a small queue of warm contexts alive
+    across scrape_sobeys calls. Each context seeds the postal code through
+    an init script and cookie, and is recycled after max_uses scrapes to keep memory in check.
+    Contexts are tagged with the browser that made them, so none outlive a relaunch.
+    The pool also owns the aiohttp session used for the plain-HTTP search probe.
+    """
+
+    def __init__(self, pool_size: int = 4, max_uses: int = 50, postal_code: str = DEFAULT_POSTAL_CODE):
+        self.pool_size = pool_size
+        self.max_uses = max_uses
+        self.postal_code = postal_code
+        self._pw = None
+        self._browser = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._created = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._http: Optional[aiohttp.ClientSession] = None
+        self.http_refused_until = 0.0
+
+    def _bind_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Playwright and aiohttp objects are bound to the loop that created
+            # them; a fresh asyncio.run() needs a fresh browser and session.
+            self._loop = loop
+            self._lock = asyncio.Lock()
+            self._pw = None
+            self._browser = None
+            self._queue = None
+            self._http = None
+
+    async def _start(self) -> None:
+        self._bind_loop()
+        async with self._lock:
+            if self._browser is not None and self._browser.is_connected():
+                return
+            if self._pw is None:
+                self._pw = await async_playwright().start()
+            old_queue = self._queue
+            self._browser = await self._pw.chromium.launch(headless=HEADLESS, args=LAUNCH_ARGS)
+            self._queue = asyncio.Queue()
+            self._created = 0
+            if old_queue is not None:
+                # Anyone still waiting on the dead browser's queue retries on this one
+                old_queue.put_nowait(_RETIRED)
+
+    @property
+    def session_file(self) -> Path:
+        return SESSION_DIR / f"sobeys_session_{self.postal_code}.json"
+
+    async def save_session(self, context) -> None:
+        try:
+            state = await context.storage_state()
+            await asyncio.to_thread(_write_session, self.session_file, state)
+        except Exception as e:
+            log.debug("Could not save Sobeys session: %s", e)
+
+    async def _new_context(self, browser):
+        # Parsed here rather than handed to Playwright as a path, so a torn or
+        # stale file costs one cold context instead of failing every checkout
+        storage_state = await asyncio.to_thread(_read_session, self.session_file)
+        context_options = {
+            "user_agent": USER_AGENT,
+            "viewport": {"width": 1280, "height": 800},
+            "device_scale_factor": 1,
+            "extra_http_headers": {
                 "Accept-Language": "en-CA,en;q=0.9",
                 "Referer": "https://www.sobeys.com/",
             },
+        }
+        try:
+            context = await browser.new_context(**context_options, storage_state=storage_state)
+        except Exception as e:
+            if storage_state is None:
+                raise
+            log.warning("Saved Sobeys session rejected (%s); starting cold.", e)
+            context = await browser.new_context(**context_options)
+        await context.route("**/*", _block_assets)
+        if stealth_async:
+            # stealth_async only queues init scripts, so on the context they reach
+            # every page the pool opens here without a round trip per search
+            with suppress(Exception):
+                await stealth_async(context)
+        await context.add_init_script(_postal_init_script(self.postal_code))
+        await context.add_cookies(
+            [{"name": "postalCode", "value": self.postal_code, "domain": ".sobeys.com", "path": "/"}]
         )
-
-        page = await context.new_page()
+        return context
+
+    async def _checkout(self) -> Tuple[Any, Any, int]:
+        while True:
+            await self._start()
+            browser, queue = self._browser, self._queue
+            if queue.empty() and self._created < self.pool_size:
+                self._created += 1
+                try:
+                    return browser, await self._new_context(browser), 0
+                except Exception:
+                    if self._queue is queue:
+                        self._created -= 1
+                    raise
+            entry = await queue.get()
+            if entry is _CLOSED:
+                queue.put_nowait(entry)
+                raise RuntimeError("Sobeys browser pool was closed")
+            if entry is _RETIRED:
+                queue.put_nowait(entry)
+                continue
+            if entry is _SLOT_FREED:
+                continue
+            return entry
+
+    def _free_slot(self, browser) -> None:
+        if browser is self._browser and self._queue is not None:
+            self._created -= 1
+            self._queue.put_nowait(_SLOT_FREED)
+
+    async def _checkin(self, browser, context, uses: int, healthy: bool = True) -> None:
+        if (
+            not healthy
+            or browser is not self._browser
+            or self._queue is None
+            or not browser.is_connected()
+        ):
+            # The context failed, the pool was closed, or its browser died or
+            # was replaced while it was out: never hand it out again
+            with suppress(Exception):
+                await context.close()
+            self._free_slot(browser)
+            return
+        if uses >= self.max_uses:
+            with suppress(Exception):
+                await context.close()
+            try:
+                context, uses = await self._new_context(browser), 0
+            except Exception:
+                self._free_slot(browser)
+                return
+            if browser is not self._browser or self._queue is None:
+                # Relaunched or closed while the replacement was being made
+                with suppress(Exception):
+                    await context.close()
+                return
+        self._queue.put_nowait((browser, context, uses))
+
+    @asynccontextmanager
+    async def acquire(self):
+        browser, context, uses = await self._checkout()
+        page = None
         try:
-            if stealth_async:
-                await stealth_async(page)
-        except Exception:
-            pass
+            page = await context.new_page()
+            yield page
+        finally:
+            if page is not None:
+                with suppress(Exception):
+                    await page.close()
+            # A context that couldn't even open a page is dropped, not requeued
+            await self._checkin(browser, context, uses + 1, healthy=page is not None)
+
+    def http_session(self) -> aiohttp.ClientSession:
+        """One aiohttp session per loop, so the HTTP probe reuses DNS, TLS and keep-alive."""
+        self._bind_loop()
+        if self._http is None or self._http.closed:
+            self._http = aiohttp.ClientSession(
+                headers={
+                    "User-Agent": USER_AGENT,
+                    "Accept": "text/html,application/xhtml+xml",
+                    "Accept-Language": "en-CA,en;q=0.9",
+                    "Referer": "https://www.sobeys.com/",
+                },
+                # Store cookie only; the browser's saved session stays out of the
+                # probe so a flagged request can't taint the contexts' cookies.
+                cookies={"postalCode": self.postal_code},
+                timeout=aiohttp.ClientTimeout(total=20),
+            )
+        return self._http
+
+    async def close(self) -> None:
+        browser, pw, queue, http = self._browser, self._pw, self._queue, self._http
+        self._browser = None
+        self._pw = None
+        self._queue = None
+        self._http = None
+        self._created = 0
+        if queue is not None:
+            queue.put_nowait(_CLOSED)
+        if http is not None:
+            with suppress(Exception):
+                await http.close()
+        if browser is not None:
+            with suppress(Exception):
+                await browser.close()
+        if pw is not None:
+            with suppress(Exception):
+                await pw.stop()
 
-        # Navigate to Sobeys home first to potentially set location
-        try:
-            print("Loading Sobeys homepage to set location...")
-            await page.goto("https://www.sobeys.com/", wait_until="domcontentloaded", timeout=45000)
-            
-            # Try to set location via localStorage
-            await page.evaluate(f"""
-                try {{
-                    localStorage.setItem('postalCode', '{postal_code}');
-                    localStorage.setItem('preferredPostal', '{postal_code}');
-                    localStorage.setItem('sobeys_postal_code', '{postal_code}');
-                }} catch(e) {{
-                    console.log('Error setting localStorage:', e);
-                }}
-            """)
-            
-            await asyncio.sleep(2)
-        except Exception as e:
-            print(f"Warning: Could not set store location: {e}")
 
-        search_url = f"https://www.sobeys.com/?query={quote_plus(search_term)}&tab=products"
+# One pool per postal code. A context's cookie, init script and saved session
+# all pin it to one store, so contexts are never shared across postal codes.
+_POOLS: Dict[str, SobeysBrowserPool] = {}
+
+
+def _pool_for(postal_code: str) -> SobeysBrowserPool:
+    pool = _POOLS.get(postal_code)
+    if pool is None:
+        pool = _POOLS[postal_code] = SobeysBrowserPool(postal_code=postal_code)
+    return pool
+
+
+async def close_sobeys_pool() -> None:
+    """Shut down the shared browsers; call once when done scraping."""
+    for pool in list(_POOLS.values()):
+        await pool.close()
+
+
+def _results_from_html(html: bytes) -> Optional[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]:
+    """Build results from server-rendered search HTML; None if it carries no search data."""
+    match = NEXT_DATA_RE.search(html)
+    if not match:
+        return None
+    try:
+        script_data = _loads(match.group(1))
+    except Exception:
+        return None
+    # A page without the search subtree was rendered client-side; only the browser sees it
+    if _search_subtree(script_data) is None:
+        return None
+    return _build_results(script_data)
+
+
+async def _fetch_results_over_http(pool: SobeysBrowserPool, search_url: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    Try the search over plain HTTP; the HTML carries the same __NEXT_DATA__
+    the browser would read. Returns None when the browser is needed.
+    """
+    if time.monotonic() < pool.http_refused_until:
+        return None
+    try:
+        async with pool.http_session().get(search_url) as resp:
+            status = resp.status
+            html = await resp.read() if status == 200 else b""
+    except Exception as e:
+        log.debug("Sobeys HTTP probe failed (%s); using the browser.", e)
+        return None
+    if status != 200 or (not NEXT_DATA_RE.search(html) and _BLOCKED_RE.search(html)):
+        log.debug("Sobeys refused the HTTP probe (status %s); using the browser for %ds.", status, HTTP_REFUSAL_COOLDOWN)
+        pool.http_refused_until = time.monotonic() + HTTP_REFUSAL_COOLDOWN
+        return None
+    # Regex, parse and item walk are CPU-bound; keep them off the event loop
+    built = await asyncio.to_thread(_results_from_html, html)
+    if built is None:
+        log.debug("Sobeys HTTP probe found no search data; using the browser.")
+        return None
+    results, debug = built
+    await _debug_dump("debug_sobeys.json", debug)
+    return results
+
+
+async def scrape_sobeys(search_term: str, postal_code: str = DEFAULT_POSTAL_CODE) -> List[Dict[str, Any]]:
+    """
+    Best-effort Sobeys search scraper: plain HTTP first, then Playwright.
+    Returns list of {name, price, unit_price, available}.
+    """
+
+    pool = _pool_for(postal_code)
+    search_url = f"https://www.sobeys.com/?query={quote_plus(search_term)}&tab=products"
+    results = await _fetch_results_over_http(pool, search_url)
+    if results is not None:
+        return results
+
+    async with pool.acquire() as page:
         try:
-            print(f"Navigating to search page: {search_url}")
-            await page.goto(search_url, wait_until="domcontentloaded", timeout=45000)
+            log.debug("Navigating to search page: %s", search_url)
+
+            # Client-side searches arrive as a JSON XHR; server-rendered ones as the
+            # __NEXT_DATA__ tag. Listen for the former while waiting for the latter.
+            search_response: asyncio.Future = asyncio.get_running_loop().create_future()
+
+            def on_response(response) -> None:
+                if (
+                    not search_response.done()
+                    and "search" in response.url
+                    and "application/json" in (response.headers.get("content-type") or "")
+                ):
+                    search_response.set_result(response)
+
+            page.on("response", on_response)
+            try:
+                await page.goto(search_url, wait_until="commit", timeout=45000)
+                next_data_wait = asyncio.ensure_future(_wait_for_next_data(page, timeout=30000))
+                await asyncio.wait({search_response, next_data_wait}, return_when=asyncio.FIRST_COMPLETED)
+                if search_response.done():
+                    try:
+                        xhr_data = _loads(await search_response.result().body())
+                        results, debug = _build_results(xhr_data)
+                    except Exception as e:
+                        log.debug("Could not use search XHR response: %s", e)
+                        results = []
+                    if results:
+                        next_data_wait.cancel()
+                        await _debug_dump("debug_sobeys.json", debug)
+                        return results
+                has_next = await next_data_wait
+            finally:
+                page.remove_listener("response", on_response)
+
+            if not has_next:
+                try:
+                    content = await page.evaluate(PAGE_TEXT_JS)
+                except Exception as e:
+                    log.warning("Error getting page content: %s", e)
+                    return []
+
+                if "page you are looking for is not available" in content or "page not found" in content:
+                    log.warning("Sobeys returned a 'page not available' message.")
+                    if DEBUG:
+                        await _debug_dump("debug_sobeys_page.html", await page.content())
+                    return []
+
+                blocked = any(phrase in content for phrase in BLOCKED_PHRASES)
+                if blocked and not HEADLESS:
+                    log.warning("!!! ACTION REQUIRED: Solve any captcha in the browser window !!!")
+                    has_next = await _wait_for_next_data(page, timeout=120000)
+                if not has_next:
+                    log.debug("No __NEXT_DATA__ found (blocked=%s); attempting extraction anyway...", blocked)
+            else:
+                log.debug("Data tag detected! Proceeding with extraction...")
 
-            # Give page time to show modals
-            print("Waiting for modals to appear...")
-            await asyncio.sleep(3)
-            
             # Handle cookie consent popup
-            print("Looking for cookie consent popup...")
+            modal_handled = False
             try:
-                # Try common cookie consent button selectors
-                cookie_selectors = [
-                    'button:has-text("Accept")',
-                    'button:has-text("Accept All")',
-                    'button:has-text("I Accept")',
-                    'button:has-text("Agree")',
-                    '[id*="accept"]',
-                    '[class*="accept"]',
-                    'button[aria-label*="Accept"]',
-                ]
-                for selector in cookie_selectors:
-                    if await page.locator(selector).count() > 0:
-                        print(f"Found cookie consent button: {selector}")
-                        await page.locator(selector).first.click()
-                        await asyncio.sleep(1)
-                        break
+                modal_handled = await _try_click(page, COOKIE_SEL)
             except Exception as e:
-                print(f"Cookie consent handling: {e}")
-            
-            # Handle location popup
-            print("Looking for location popup...")
-            await asyncio.sleep(1)
+                log.debug("Cookie consent handling: %s", e)
+
+            # Handle location popup: fill the postal code if asked, otherwise dismiss it
             try:
-                # Look for location input or skip button
-                location_selectors = [
-                    'input[placeholder*="postal"]',
-                    'input[placeholder*="Postal"]',
-                    'input[type="text"][name*="postal"]',
-                ]
-                
-                location_input_found = False
-                for selector in location_selectors:
-                    if await page.locator(selector).count() > 0:
-                        print(f"Found location input: {selector}")
-                        await page.locator(selector).first.fill(postal_code)
-                        await asyncio.sleep(1)
-                        
-                        # Try to submit
-                        submit_selectors = [
-                            'button:has-text("Submit")',
-                            'button:has-text("Confirm")',
-                            'button:has-text("Set")',
-                            'button[type="submit"]',
-                        ]
-                        for submit_sel in submit_selectors:
-                            if await page.locator(submit_sel).count() > 0:
-                                await page.locator(submit_sel).first.click()
-                                await asyncio.sleep(2)
-                                break
-                        location_input_found = True
-                        break
-                
-                # Try to close/skip location modal
-                if not location_input_found:
-                    close_selectors = [
-                        'button:has-text("Skip")',
-                        'button:has-text("Close")',
-                        'button:has-text("Not Now")',
-                        '[aria-label*="Close"]',
-                        '[class*="close"]',
-                    ]
-                    for selector in close_selectors:
-                        if await page.locator(selector).count() > 0:
-                            print(f"Closing location modal: {selector}")
-                            await page.locator(selector).first.click()
-                            await asyncio.sleep(1)
-                            break
+                location_input = page.locator(LOCATION_INPUT_SEL).first
+                location_input_found = await location_input.is_visible()
+                if location_input_found:
+                    try:
+                        await location_input.fill(postal_code, timeout=1500)
+                    except PlaywrightTimeoutError:
+                        location_input_found = False
+                if location_input_found:
+                    await _try_click(page, SUBMIT_SEL)
+                    modal_handled = True
+                elif await _try_click(page, CLOSE_SEL):
+                    modal_handled = True
             except Exception as e:
-                print(f"Location popup handling: {e}")
+                log.debug("Location popup handling: %s", e)
+
+            # Remember the dismissed modals so later runs don't see them again
+            if modal_handled:
+                await pool.save_session(page.context)
 
-            # Give page extra time to render after modals
-            print("Waiting for page to fully load...")
-            await asyncio.sleep(3)
-            
-            # Check if page is still open
             if page.is_closed():
-                print("Error: Page closed unexpectedly after navigation")
-                await browser.close()
+                log.warning("Page closed unexpectedly after navigation")
                 return []
-            
-            print(f"Current URL: {page.url}")
 
-            for i in range(60):
-                try:
-                    content = (await page.content()).lower()
-                except Exception as e:
-                    print(f"Error getting page content: {e}")
-                    try:
-                        html = await page.content()
-                        with open("debug_sobeys_page.html", "w", encoding="utf-8") as hf:
-                            hf.write(html)
-                        print("Saved page HTML to debug_sobeys_page.html")
-                    except:
-                        pass
-                    await browser.close()
-                    return []
-                    
-                if "page you are looking for is not available" in content or "page not found" in content:
-                    print("Sobeys returned a 'page not available' message.")
-                    try:
-                        html = await page.content()
-                        with open("debug_sobeys_page.html", "w", encoding="utf-8") as hf:
-                            hf.write(html)
-                        print("Saved page HTML to debug_sobeys_page.html")
-                    except Exception as e:
-                        print(f"Failed to write debug HTML: {e}")
-                    await browser.close()
-                    return []
-
-                blocked = any(
-                    phrase in content
-                    for phrase in (
-                        "verify you are human",
-                        "press & hold",
-                        "access to this page has been denied",
-                        "unusual traffic",
-                    )
-                )
-                has_next = await page.locator("script#__NEXT_DATA__").count() > 0
-                
-                print(f"Loop {i}: has_next={has_next}, blocked={blocked}")
-                
-                if blocked and not has_next:
-                    if i % 5 == 0:
-                        print("!!! ACTION REQUIRED: Solve any captcha in the browser window !!!")
-                    await asyncio.sleep(2)
-                elif has_next:
-                    print("Data tag detected! Proceeding with extraction...")
-                    break
-                elif i >= 5:  # After 5 attempts, break and try to extract anyway
-                    print("No __NEXT_DATA__ found after waiting; attempting extraction anyway...")
-                    break
-                else:
-                    await asyncio.sleep(1)
+            log.debug("Current URL: %s", page.url)
 
             script_data: Any = None
-            raw_json = ""
-
-            print("Looking for data scripts...")
-            if await page.locator("script#__NEXT_DATA__").count() > 0:
-                print("Found script#__NEXT_DATA__")
-                script = page.locator("script#__NEXT_DATA__").first
-                await script.wait_for(state="attached", timeout=20000)
-                raw_json = await script.inner_text()
-            else:
-                print("No script#__NEXT_DATA__ found, trying fallback...")
-                # Fallback: grab any big application/json script blobs
-                scripts = page.locator('script[type="application/json"]')
-                script_count = await scripts.count()
-                print(f"Found {script_count} application/json scripts")
-                if script_count > 0:
-                    raw_json = await scripts.nth(0).inner_text()
 
+            # One round-trip: textContent of the data tag, or the first JSON blob as a fallback
+            raw_json = await page.evaluate(DATA_SCRIPT_JS)
             if raw_json:
+                await _debug_dump("debug_sobeys_raw.json", raw_json[:100000])
                 try:
-                    with open("debug_sobeys_raw.json", "w", encoding="utf-8") as rf:
-                        rf.write(raw_json[:100000])  # Save more data
-                    print(f"Saved raw data snippet (len={len(raw_json)}) to debug_sobeys_raw.json")
-                except Exception as e:
-                    print(f"Failed to write raw debug: {e}")
-
-            if raw_json:
-                try:
-                    script_data = json.loads(raw_json)
+                    script_data = _loads(raw_json)
                 except Exception:
                     start = raw_json.find("{")
                     end = raw_json.rfind("}")
                     if start != -1 and end != -1:
                         try:
-                            script_data = json.loads(raw_json[start : end + 1])
+                            script_data = _loads(raw_json[start : end + 1])
                         except Exception:
                             script_data = None
+            else:
+                log.debug("No __NEXT_DATA__ or application/json script content found")
 
             if script_data is None:
                 try:
-                    print("Trying window.__NEXT_DATA__...")
                     script_data = await page.evaluate("() => window.__NEXT_DATA__ || window.__INITIAL_STATE__ || null")
-                    if script_data:
-                        print(f"Found window data: {type(script_data)}")
                 except Exception as e:
-                    print(f"Error evaluating window data: {e}")
+                    log.debug("Error evaluating window data: %s", e)
                     script_data = None
 
             if not isinstance(script_data, dict):
-                print(f"Script data is not a dict, it's: {type(script_data)}")
-                try:
-                    html = await page.content()
-                    with open("debug_sobeys_page.html", "w", encoding="utf-8") as hf:
-                        hf.write(html)
-                    print("Saved raw HTML to debug_sobeys_page.html for inspection.")
-                except Exception:
-                    pass
-                print("Error: could not parse Sobeys data blob; returning empty list.")
-                await browser.close()
+                log.warning("Could not parse Sobeys data blob (got %s); returning empty list.", type(script_data).__name__)
+                if DEBUG:
+                    try:
+                        await _debug_dump("debug_sobeys_page.html", await page.content())
+                    except Exception:
+                        pass
                 return []
 
-            print(f"Script data keys: {list(script_data.keys()) if isinstance(script_data, dict) else 'N/A'}")
-
-            try:
-                props = script_data.get("props", {}) if isinstance(script_data, dict) else {}
-                page_props = props.get("pageProps", {}) if isinstance(props, dict) else {}
-                print(f"pageProps keys: {list(page_props.keys()) if isinstance(page_props, dict) else 'N/A'}")
-                initial = page_props.get("initialSearchData") if isinstance(page_props, dict) else None
+            if DEBUG:
+                initial = _search_subtree(script_data)
                 if initial is not None:
-                    with open("debug_sobeys_initial.json", "w", encoding="utf-8") as sf:
-                        json.dump(initial, sf, indent=2, ensure_ascii=False)
-                    print("Wrote debug_sobeys_initial.json")
+                    await _debug_dump("debug_sobeys_initial.json", initial)
                 else:
-                    print("No initialSearchData found")
-            except Exception as e:
-                print(f"Error extracting pageProps: {e}")
-
-            products = _collect_products(script_data)
-            results: List[Dict[str, Any]] = []
-            debug: List[Dict[str, Any]] = []
-            seen: set[str] = set()
-
-            for item in products:
-                if not isinstance(item, dict):
-                    continue
-                name = item.get("name") or item.get("title")
-                if not isinstance(name, str):
-                    continue
-
-                pid = _unique_identifier(item)
-                if pid in seen:
-                    continue
-                seen.add(pid)
-
-                price, unit_price = _extract_price_fields(item)
-                available = _is_available(item)
-
-                results.append(
-                    {
-                        "name": name,
-                        "price": price,
-                        "unit_price": unit_price,
-                        "available": available,
-                    }
-                )
-
-                debug.append(
-                    {
-                        "id": pid,
-                        "name": name,
-                        "has_price": price is not None,
-                        "unit_price": unit_price,
-                        "availabilityStatus": item.get("availabilityStatus") or item.get("inventoryStatus"),
-                        "keys": sorted(list(item.keys())),
-                    }
-                )
-
-            print(f"Sobeys: extracted {len(results)} items (unique by id/name).")
-            try:
-                with open("debug_sobeys.json", "w", encoding="utf-8") as df:
-                    json.dump(debug, df, indent=2, ensure_ascii=False)
-                print("Wrote debug_sobeys.json for inspection.")
-            except Exception as e:
-                print(f"Failed to write debug file: {e}")
+                    log.debug("No initialSearchData found")
 
-            await browser.close()
+            results, debug = _build_results(script_data)
+            await _debug_dump("debug_sobeys.json", debug)
             return results
 
         except Exception as exc:
-            print(f"Sobeys scraper error: {exc}")
-            traceback.print_exc()
-            await browser.close()
+            log.warning("Sobeys scraper error: %s", exc)
+            if DEBUG:
+                log.exception("Sobeys scrape failed")
             return []
 
 
+async def scrape_sobeys_many(
+    terms: List[str], postal_code: str = DEFAULT_POSTAL_CODE, concurrency: int = 4
+) -> List[List[Dict[str, Any]]]:
+    """
+    Scrape several search terms concurrently over the shared browser pool.
+    Results are returned in the same order as `terms`.
+    """
+    semaphore = asyncio.Semaphore(max(1, min(concurrency, _pool_for(postal_code).pool_size)))
+
+    async def one(term: str) -> List[Dict[str, Any]]:
+        async with semaphore:
+            return await scrape_sobeys(term, postal_code)
+
+    return await asyncio.gather(*(one(term) for term in terms))
+
+
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG if DEBUG else logging.INFO, format="%(message)s")
     query = "milk"
-    output = asyncio.run(scrape_sobeys(query))
+
+    async def _run_once() -> List[Dict[str, Any]]:
+        try:
+            return await scrape_sobeys(query)
+        finally:
+            await close_sobeys_pool()
+
+    output = asyncio.run(_run_once())
     print(f"\nFound {len(output)} items for '{query}'. Showing first 10...")
     for entry in output[:10]:
         p = entry["price"]
@@ -1,12 +1,22 @@
 import asyncio
 import json
+import os
 import re
+import tempfile
+import time
 import traceback
+from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 from urllib.parse import quote_plus
 
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 from playwright.async_api import async_playwright
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # IMPORTANT: playwright-stealth v2.0.0+ exports just 'stealth' which works for both sync/async.
 try:
     from playwright_stealth import stealth_async
@@ -24,13 +34,192 @@ USER_AGENT = (
     "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 )
 
+# Set SUPERSTORE_DEBUG=1 to dump the raw page data and per-item debug records to disk
+# and print full tracebacks for failed searches
+DEBUG = os.environ.get("SUPERSTORE_DEBUG") == "1"
+
+# Cookies + localStorage (store selection, postal code) survive restarts here
+SESSION_DIR = Path(__file__).parent / ".superstore_sessions"
+
+# Headless by default; set SUPERSTORE_HEADFUL=1 to get a visible window for solving captchas
+HEADLESS = os.environ.get("SUPERSTORE_HEADFUL") != "1"
+
+# Fail fast on stuck navigations and missing data instead of hanging for the better part of a minute
+NAVIGATION_TIMEOUT_MS = 8000
+DATA_TIMEOUT_MS = 12000
+
+# Only the document and its scripts are needed to get at __NEXT_DATA__
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "media", "font", "stylesheet"})
+BLOCKED_HOSTS_RE = re.compile(
+    r"https?://[^/]*(?:google-analytics|googletagmanager|doubleclick|facebook|hotjar"
+    r"|optimizely|newrelic|nr-data|demdex|omtrdc|criteo|bing)\.",
+    re.IGNORECASE,
+)
+
+_CURRENCY_RE = re.compile(r"[^0-9.,]")
+_COMMA_KILL = str.maketrans("", "", ",")
+_QTY_RE = re.compile(r"(\d+\s*(?:L|ML|g|kg|oz|lb|pack|count|piece|ct))", re.IGNORECASE)
+
+# Key orders matter: the first key that yields a usable value wins
+_PRICE_VALUE_KEYS = ("sale", "current", "list", "regular", "price", "amount", "value", "priceValue")
+_PRICE_VALUE_KEYS_SET = frozenset(_PRICE_VALUE_KEYS)
+_PRICING_KEYS = ("price", "current", "regular", "sale", "list", "value", "priceValue")
+_PRICING_KEYS_SET = frozenset(_PRICING_KEYS)
+_UNIT_KEYS = ("unitPrice", "unit", "pricePerUnit", "comparisonPrice")
+_UNIT_KEYS_SET = frozenset(_UNIT_KEYS)
+
+_ID_KEYS = ("sku", "id", "productId", "code", "gtin", "upc")
+
+_AVAIL_RE = re.compile(r"in stock|available|add to cart", re.IGNORECASE)
+_AVAILABILITY_FIELDS = ("availabilityStatus", "availability", "availabilityMessage", "availabilityText")
+_AVAILABILITY_FLAGS = ("isAvailable", "available", "buyable", "canAddToCart")
+_OOS_STATUSES = frozenset(("OUT_OF_STOCK", "SOLD_OUT", "UNAVAILABLE"))
+_QUANTITY_KEYS = ("packageSizing", "size", "quantity", "format", "packaging", "unitQuantity", "volumePrice")
+
+_PRICE_KEYS = frozenset(("price", "pricing", "prices", "regularPrice"))
+_PRODUCT_TYPES = frozenset(("Product", "SellableProduct"))
+
+_SEARCH_DATA_PATH = ("props", "pageProps", "initialSearchData")
+
+# Every top-level product field the extractors read. The in-page projection
+# sends only these back over CDP instead of whole product nodes.
+_ITEM_FIELDS = list(dict.fromkeys((
+    "__typename", "name", "title", *_ID_KEYS,
+    *_PRICE_KEYS, *_UNIT_KEYS,
+    *_AVAILABILITY_FIELDS, *_AVAILABILITY_FLAGS,
+    *_QUANTITY_KEYS,
+)))
+
+BLOCKED_PHRASES = (
+    "verify you are human",
+    "press & hold",
+    "access to this page has been denied",
+    "unusual traffic",
+)
+# Same phrases, checked in-page against the rendered text while waiting for data
+_CAPTCHA_JS = (
+    "() => { const t = ((document.body && document.body.innerText) || '').toLowerCase(); "
+    f"return {json.dumps(list(BLOCKED_PHRASES))}.some((p) => t.includes(p)); }}"
+)
+
+# One case-insensitive pass over the raw document bytes finds any of the phrases;
+# the page is never decoded or lowercased just to be scanned
+_BLOCKED_RE = re.compile(
+    b"|".join(re.escape(phrase.encode()) for phrase in BLOCKED_PHRASES), re.IGNORECASE
+)
+
+# Mirrors _search_subtree + _collect_products in the page so only product
+# nodes, projected to `fields`, cross the CDP bridge. Returns null if the
+# blob can't be parsed.
+_EXTRACT_PRODUCTS_JS = """(fields) => {
+    const tag = document.getElementById('__NEXT_DATA__');
+    if (!tag) return null;
+    let data;
+    try { data = JSON.parse(tag.textContent); } catch (e) { return null; }
+    const PRICE_KEYS = ['price', 'pricing', 'prices', 'regularPrice'];
+    const TYPES = new Set(['Product', 'SellableProduct']);
+    const walk = (root) => {
+        const found = [];
+        const stack = [root];
+        while (stack.length) {
+            const node = stack.pop();
+            if (Array.isArray(node)) {
+                for (let i = node.length - 1; i >= 0; i--) stack.push(node[i]);
+            } else if (node !== null && typeof node === 'object') {
+                if (TYPES.has(node.__typename) || (
+                    (typeof node.name === 'string' || typeof node.title === 'string')
+                    && PRICE_KEYS.some((k) => Object.prototype.hasOwnProperty.call(node, k))
+                )) {
+                    const picked = {};
+                    for (const k of fields) {
+                        if (Object.prototype.hasOwnProperty.call(node, k)) picked[k] = node[k];
+                    }
+                    found.push(picked);
+                }
+                const values = Object.values(node);
+                for (let i = values.length - 1; i >= 0; i--) stack.push(values[i]);
+            }
+        }
+        return found;
+    };
+    const search = data && data.props && data.props.pageProps
+        ? data.props.pageProps.initialSearchData : undefined;
+    let products = (search !== null && typeof search === 'object') ? walk(search) : [];
+    if (!products.length) products = walk(data);
+    return products;
+}"""
+
+
+def _loads(raw: Any) -> Any:
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _dump_json_file(obj: Any, path: str) -> None:
+    if orjson is not None:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=2, ensure_ascii=False)
+
+
+def _read_session(path: Path) -> Optional[Dict[str, Any]]:
+    """Saved storage state, or None when it is missing or unreadable."""
+    try:
+        state = _loads(path.read_bytes())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Ignoring unreadable Superstore session {path.name}: {e}")
+        return None
+    return state if isinstance(state, dict) else None
+
+
+def _write_session(path: Path, state: Dict[str, Any]) -> None:
+    """Write storage state via a temp file and rename, so readers never see half a file."""
+    path.parent.mkdir(exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(orjson.dumps(state) if orjson is not None else json.dumps(state).encode())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _write_debug_file(path: str, data: Any) -> None:
+    if isinstance(data, str):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(data)
+    else:
+        _dump_json_file(data, path)
+
+
+async def _debug_dump(path: str, data: Any) -> None:
+    """Write a debug artifact off the event loop; no-op unless DEBUG is set."""
+    if not DEBUG:
+        return
+    try:
+        await asyncio.to_thread(_write_debug_file, path, data)
+        print(f"Wrote {path} for inspection.")
+    except Exception as e:
+        print(f"Failed to write {path}: {e}")
+
 
 def _strip_currency(val: str) -> Optional[float]:
-    cleaned = re.sub(r"[^0-9.,]", "", val)
-    cleaned = cleaned.replace(",", "").strip()
+    # Plain "4.99" style strings skip the regex pass entirely
+    if val.isascii() and val.replace(".", "", 1).isdigit():
+        return float(val)
+    cleaned = _CURRENCY_RE.sub("", val).translate(_COMMA_KILL)
     try:
         return float(cleaned)
-    except Exception:
+    except ValueError:
         return None
 
 
@@ -41,19 +230,10 @@ def _normalize_price(v: Any) -> Optional[float]:
         return float(v)
     if isinstance(v, str):
         return _strip_currency(v)
-    if isinstance(v, dict):
-        for key in (
-            "sale",
-            "current",
-            "list",
-            "regular",
-            "price",
-            "amount",
-            "value",
-            "priceValue",
-        ):
+    if isinstance(v, dict) and not _PRICE_VALUE_KEYS_SET.isdisjoint(v):
+        for key in _PRICE_VALUE_KEYS:
             if key in v:
-                maybe = _normalize_price(v.get(key))
+                maybe = _normalize_price(v[key])
                 if maybe is not None:
                     return maybe
     return None
@@ -62,12 +242,11 @@ def _normalize_price(v: Any) -> Optional[float]:
 def _extract_unit_price(v: Any) -> Optional[str]:
     if isinstance(v, str):
         return v.strip()
-    if isinstance(v, dict):
-        for key in ("unitPrice", "unit", "pricePerUnit", "comparisonPrice"):
-            if key in v:
-                inner = v.get(key)
-                if isinstance(inner, str):
-                    return inner.strip()
+    if isinstance(v, dict) and not _UNIT_KEYS_SET.isdisjoint(v):
+        for key in _UNIT_KEYS:
+            inner = v.get(key)
+            if isinstance(inner, str):
+                return inner.strip()
     return None
 
 
@@ -78,19 +257,13 @@ def _extract_price_fields(item: Dict[str, Any]) -> Tuple[Optional[float], Option
     # Common loblaws/PCX shapes: pricing -> price or prices
     pricing = item.get("pricing") or item.get("price") or item.get("prices")
     if isinstance(pricing, dict):
-        for key in (
-            "price",
-            "current",
-            "regular",
-            "sale",
-            "list",
-            "value",
-            "priceValue",
-        ):
-            if price is None and key in pricing:
-                price = _normalize_price(pricing.get(key))
-        if unit_price is None:
-            unit_price = _extract_unit_price(pricing)
+        if not _PRICING_KEYS_SET.isdisjoint(pricing):
+            for key in _PRICING_KEYS:
+                if key in pricing:
+                    price = _normalize_price(pricing[key])
+                    if price is not None:
+                        break
+        unit_price = _extract_unit_price(pricing)
 
     # Sometimes price lives directly as primitive/dict
     if price is None and "price" in item:
@@ -105,36 +278,18 @@ def _extract_price_fields(item: Dict[str, Any]) -> Tuple[Optional[float], Option
     return price, unit_price
 
 
-def _is_available(item: Dict[str, Any]) -> bool:
-    availability_fields = (
-        item.get("availabilityStatus"),
-        item.get("availability"),
-        item.get("availabilityMessage"),
-        item.get("availabilityText"),
-    )
-    for val in availability_fields:
-        if isinstance(val, str) and any(
-            kw in val.lower()
-            for kw in ("in stock", "available", "add to cart", "available online")
-        ):
-            return True
-
-    flags = (
-        item.get("isAvailable"),
-        item.get("available"),
-        item.get("buyable"),
-        item.get("canAddToCart"),
-    )
-    if any(flag is True for flag in flags):
+def _is_available(item: Dict[str, Any], price: Optional[float]) -> bool:
+    # Newline-joined so a keyword can't straddle two fields
+    texts = [val for val in map(item.get, _AVAILABILITY_FIELDS) if isinstance(val, str)]
+    if texts and _AVAIL_RE.search("\n".join(texts)):
+        return True
+
+    if any(flag is True for flag in map(item.get, _AVAILABILITY_FLAGS)):
         return True
 
     # If we have a price and no explicit out-of-stock markers, lean optimistic
-    price, _ = _extract_price_fields(item)
     status = item.get("availabilityStatus")
-    if price is not None and not (
-        isinstance(status, str)
-        and status.upper() in ("OUT_OF_STOCK", "SOLD_OUT", "UNAVAILABLE")
-    ):
+    if price is not None and not (isinstance(status, str) and status.upper() in _OOS_STATUSES):
         return True
     return False
 
@@ -142,7 +297,7 @@ def _is_available(item: Dict[str, Any]) -> bool:
 def _extract_quantity(product: Dict[str, Any]) -> Optional[str]:
     """Extract package size/quantity from product dict."""
     # Try common field names
-    for key in ("packageSizing", "size", "quantity", "format", "packaging", "unitQuantity", "volumePrice"):
+    for key in _QUANTITY_KEYS:
         val = product.get(key)
         if val and isinstance(val, str) and val.strip():
             return val.strip()
@@ -150,47 +305,181 @@ def _extract_quantity(product: Dict[str, Any]) -> Optional[str]:
     # Try extracting from name/title
     name = product.get("title") or product.get("name") or ""
     if name:
-        match = re.search(r'(\d+\s*(?:L|ML|g|kg|oz|lb|pack|count|piece|ct))', name, re.IGNORECASE)
+        match = _QTY_RE.search(name)
         if match:
             return match.group(1)
     
     return None
 
 
+def _extract_all(item: Dict[str, Any], name: str) -> Dict[str, Any]:
+    """Build the result record for one product, extracting the price only once."""
+    price, unit_price = _extract_price_fields(item)
+    return {
+        "name": name,
+        "price": price,
+        "unit_price": unit_price,
+        "quantity": _extract_quantity(item),
+        "available": _is_available(item, price),
+    }
+
+
 def _collect_products(tree: Any) -> List[Dict[str, Any]]:
     found: List[Dict[str, Any]] = []
-
-    def walk(node: Any):
-        if isinstance(node, dict):
-            looks_like_product = False
-            if node.get("__typename") in ("Product", "SellableProduct"):
-                looks_like_product = True
-            if isinstance(node.get("name"), str) and any(
-                key in node for key in ("price", "pricing", "prices", "regularPrice")
+    stack: List[Any] = [tree]
+    pop = stack.pop
+    extend = stack.extend
+
+    # Children are pushed reversed so nodes come out in the same pre-order
+    # the old recursive walk produced (first occurrence wins during dedup).
+    while stack:
+        node = pop()
+        t = type(node)
+        if t is dict:
+            if node.get("__typename") in _PRODUCT_TYPES or (
+                (isinstance(node.get("name"), str) or isinstance(node.get("title"), str))
+                and not _PRICE_KEYS.isdisjoint(node)
             ):
-                looks_like_product = True
-            if isinstance(node.get("title"), str) and any(
-                key in node for key in ("price", "pricing", "prices", "regularPrice")
-            ):
-                looks_like_product = True
-            if looks_like_product:
                 found.append(node)
-            for v in node.values():
-                walk(v)
-        elif isinstance(node, list):
-            for v in node:
-                walk(v)
-
-    walk(tree)
+            extend(reversed(node.values()))
+        elif t is list:
+            extend(reversed(node))
     return found
 
 
-def _unique_identifier(item: Dict[str, Any]) -> str:
-    for key in ("sku", "id", "productId", "code", "gtin", "upc"):
-        if key in item and item.get(key):
-            return str(item.get(key))
-    name = item.get("name") or item.get("title") or "unknown"
-    return str(name)
+def _search_subtree(data: Any) -> Any:
+    """Narrow the Next.js blob to the search results, or None if the shape differs."""
+    node = data
+    for key in _SEARCH_DATA_PATH:
+        if not isinstance(node, dict):
+            return None
+        node = node.get(key)
+    return node
+
+
+def _parse_and_collect(raw_json: str) -> Tuple[Any, List[Dict[str, Any]]]:
+    """Parse the __NEXT_DATA__ text and pull out product nodes; safe to run in a thread."""
+    data: Any = None
+    try:
+        data = _loads(raw_json)
+    except Exception:
+        start = raw_json.find("{")
+        end = raw_json.rfind("}")
+        if start != -1 and end != -1:
+            try:
+                data = _loads(raw_json[start : end + 1])
+            except Exception:
+                data = None
+    if not isinstance(data, dict):
+        return data, []
+
+    # Walking only the search subtree skips layout/nav/config bulk;
+    # fall back to the whole tree if the schema drifts.
+    search_data = _search_subtree(data)
+    products = _collect_products(search_data) if search_data is not None else []
+    if not products:
+        products = _collect_products(data)
+    return data, products
+
+
+def _unique_identifier(item: Dict[str, Any], name: str) -> str:
+    """First truthy id-like field, else the already-resolved product name."""
+    return next(
+        (str(value) for value in map(item.get, _ID_KEYS) if value),
+        name or "unknown",
+    )
+
+
+async def _block_assets(route) -> None:
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or BLOCKED_HOSTS_RE.match(request.url):
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+# Search results per (normalized query, postal code) -> (timestamp, results)
+CACHE_TTL = 600
+_CACHE: Dict[Tuple[str, str], Tuple[float, List[Dict[str, Any]]]] = {}
+
+
+def clear_superstore_cache() -> None:
+    _CACHE.clear()
+
+
+async def _wait_for_data_or_captcha(page, timeout: int, watch_captcha: bool = True) -> str:
+    """
+    Race the data tag attaching against a bot-check message rendering.
+    Returns "data", "captcha" or "timeout"; the losing wait is cancelled.
+    """
+    data_wait = asyncio.ensure_future(
+        page.wait_for_selector("script#__NEXT_DATA__", state="attached", timeout=timeout)
+    )
+    waits = {data_wait}
+    captcha_wait = None
+    if watch_captcha:
+        captcha_wait = asyncio.ensure_future(page.wait_for_function(_CAPTCHA_JS, timeout=timeout))
+        waits.add(captcha_wait)
+
+    pending = waits
+    outcome = "timeout"
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if data_wait in done and data_wait.exception() is None:
+                outcome = "data"
+                break
+            if captcha_wait is not None and captcha_wait in done and captcha_wait.exception() is None:
+                outcome = "captcha"
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+        # Retrieve every result so timeouts/cancellations aren't reported as unhandled
+        await asyncio.gather(*waits, return_exceptions=True)
+    return outcome
+
+
+_pw = None
+_browser = None
+_browser_lock: Optional[asyncio.Lock] = None
+_browser_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+async def _get_browser():
+    """Lazily start one shared Chromium; each scrape gets its own context."""
+    global _pw, _browser, _browser_lock, _browser_loop
+    loop = asyncio.get_running_loop()
+    if _browser_loop is not loop:
+        # Playwright objects can't cross event loops; start over on a new one
+        _browser_loop = loop
+        _browser_lock = asyncio.Lock()
+        _pw = None
+        _browser = None
+    async with _browser_lock:
+        if _browser is None or not _browser.is_connected():
+            if _pw is None:
+                _pw = await async_playwright().start()
+            _browser = await _pw.chromium.launch(headless=HEADLESS)
+        return _browser
+
+
+async def close_superstore() -> None:
+    """Close the shared Superstore browser; call once when done scraping."""
+    global _pw, _browser
+    browser, pw = _browser, _pw
+    _browser = None
+    _pw = None
+    if browser is not None:
+        try:
+            await browser.close()
+        except Exception:
+            pass
+    if pw is not None:
+        try:
+            await pw.stop()
+        except Exception:
+            pass
 
 
 async def scrape_superstore(search_term: str, postal_code: str = DEFAULT_POSTAL_CODE) -> List[Dict[str, Any]]:
@@ -199,29 +488,55 @@ async def scrape_superstore(search_term: str, postal_code: str = DEFAULT_POSTAL_
 
     Returns a list of dicts with schema:
     {"name": str, "price": float|None, "unit_price": str|None, "available": bool}
-    """
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=False)
-        context = await browser.new_context(
-            user_agent=USER_AGENT,
-            viewport={"width": 1280, "height": 800},
-            device_scale_factor=1,
-            extra_http_headers={
-                "Accept-Language": "en-CA,en;q=0.9",
-                "Referer": "https://www.realcanadiansuperstore.ca/",
-            },
-        )
-
-        # Hint the site about postal code; site also prompts in-page if it needs confirmation.
-        await context.add_init_script(
-            f"""
-            try {{
-                window.localStorage.setItem('pcx:postal_code','{postal_code}');
-                window.localStorage.setItem('pcx:preferred_store_postal','{postal_code}');
-            }} catch (e) {{}}
-            """
-        )
+    Non-empty results are cached per (query, postal code) for CACHE_TTL seconds.
+    """
+    cache_key = (search_term.strip().lower(), postal_code)
+    cached = _CACHE.get(cache_key)
+    if cached is not None and time.monotonic() - cached[0] < CACHE_TTL:
+        # Callers annotate the dicts they get back, so hand out copies
+        return [dict(item) for item in cached[1]]
+
+    browser = await _get_browser()
+    session_file = SESSION_DIR / f"superstore_session_{postal_code}.json"
+    # Parsed here rather than handed to Playwright as a path, so a torn or stale
+    # file costs one cold context instead of failing every scrape
+    storage_state = await asyncio.to_thread(_read_session, session_file)
+    context_options = {
+        "user_agent": USER_AGENT,
+        "viewport": {"width": 1280, "height": 800},
+        "device_scale_factor": 1,
+        "extra_http_headers": {
+            "Accept-Language": "en-CA,en;q=0.9",
+            "Referer": "https://www.realcanadiansuperstore.ca/",
+        },
+    }
+    try:
+        context = await browser.new_context(**context_options, storage_state=storage_state)
+    except Exception as e:
+        if storage_state is None:
+            raise
+        print(f"Saved Superstore session rejected ({e}); starting cold.")
+        storage_state = None
+        context = await browser.new_context(**context_options)
+    warm = storage_state is not None
+    # Everything after this point runs under the finally, so a failure anywhere
+    # (routing, page creation, navigation) still releases the context
+    try:
+        await context.route("**/*", _block_assets)
+        context.set_default_navigation_timeout(NAVIGATION_TIMEOUT_MS)
+
+        if not warm:
+            # Hint the site about postal code; site also prompts in-page if it needs confirmation.
+            # Once a session is saved, the store selection comes back with it.
+            await context.add_init_script(
+                f"""
+                try {{
+                    window.localStorage.setItem('pcx:postal_code','{postal_code}');
+                    window.localStorage.setItem('pcx:preferred_store_postal','{postal_code}');
+                }} catch (e) {{}}
+                """
+            )
 
         page = await context.new_page()
         try:
@@ -233,89 +548,78 @@ async def scrape_superstore(search_term: str, postal_code: str = DEFAULT_POSTAL_
         search_url = f"https://www.realcanadiansuperstore.ca/search?search-bar={quote_plus(search_term)}"
         try:
             print("Navigating to Superstore search page...")
-            await page.goto(search_url, wait_until="domcontentloaded", timeout=45000)
-
-            # Basic captcha/blocked detection loop
-            for i in range(60):
-                content = (await page.content()).lower()
-                blocked = any(
-                    phrase in content
-                    for phrase in (
-                        "verify you are human",
-                        "press & hold",
-                        "access to this page has been denied",
-                        "unusual traffic",
-                    )
-                )
-                has_data = await page.locator("script#__NEXT_DATA__").count() > 0
-                if blocked and not has_data:
-                    if i % 5 == 0:
-                        print("!!! ACTION REQUIRED: Solve any captcha in the browser window !!!")
-                    await asyncio.sleep(2)
-                elif has_data:
-                    break
-                else:
-                    await asyncio.sleep(1)
-
-            script = page.locator("script#__NEXT_DATA__")
+            # Return as soon as the main frame commits; __NEXT_DATA__ usually lands
+            # well before domcontentloaded, and a stuck navigation fails fast.
             try:
-                await script.wait_for(state="attached", timeout=20000)
-            except Exception:
-                print("Timeout: __NEXT_DATA__ script not found.")
-                await browser.close()
+                response = await page.goto(search_url, wait_until="commit")
+            except PlaywrightTimeoutError:
+                print("Superstore navigation timed out.")
                 return []
 
-            raw_json = await script.inner_text()
-            try:
-                with open("debug_superstore_raw.json", "w", encoding="utf-8") as rf:
-                    rf.write(raw_json[:50000])
-                print(f"Saved raw __NEXT_DATA__ snippet (len={len(raw_json)}) to debug_superstore_raw.json")
-            except Exception as e:
-                print(f"Failed to write raw debug: {e}")
-            data: Any = None
-            try:
-                data = json.loads(raw_json)
-            except Exception:
-                start = raw_json.find("{")
-                end = raw_json.rfind("}")
-                if start != -1 and end != -1:
-                    try:
-                        data = json.loads(raw_json[start : end + 1])
-                    except Exception:
-                        data = None
-
-            if not isinstance(data, dict):
-                print("Error: could not parse Next.js data blob.")
-                await browser.close()
+            # Scan the document we were served once, instead of re-serializing the DOM in a loop
+            blocked = False
+            if response is not None:
+                try:
+                    blocked = _BLOCKED_RE.search(await response.body()) is not None
+                except Exception:
+                    pass
+
+            outcome = await _wait_for_data_or_captcha(page, timeout=DATA_TIMEOUT_MS)
+            if outcome == "captcha" or (blocked and outcome != "data"):
+                if HEADLESS:
+                    print("Superstore served a bot check; rerun with SUPERSTORE_HEADFUL=1 to solve it.")
+                    return []
+                print("!!! ACTION REQUIRED: Solve any captcha in the browser window !!!")
+                outcome = await _wait_for_data_or_captcha(page, timeout=120000, watch_captcha=False)
+            if outcome != "data":
+                print("Timeout: __NEXT_DATA__ script not found.")
                 return []
 
-            # Basic structure probes for debugging
-            try:
-                top_keys = list(data.keys()) if isinstance(data, dict) else []
-                props = data.get("props", {}) if isinstance(data, dict) else {}
-                page_props = props.get("pageProps", {}) if isinstance(props, dict) else {}
-                print(f"Top-level keys: {top_keys}")
-                print(f"props keys: {list(props.keys()) if isinstance(props, dict) else []}")
-                print(f"pageProps keys: {list(page_props.keys()) if isinstance(page_props, dict) else []}")
-
-                initial_search = page_props.get("initialSearchData") if isinstance(page_props, dict) else None
-                if initial_search is not None:
-                    try:
-                        with open("debug_superstore_initial.json", "w", encoding="utf-8") as sf:
-                            json.dump(initial_search, sf, indent=2, ensure_ascii=False)
-                        print("Wrote debug_superstore_initial.json")
-                    except Exception as e:
-                        print(f"Failed to write initialSearchData: {e}")
-            except Exception:
-                pass
+            # Walk the blob in-page and ship back only the product nodes; the raw
+            # text path below is kept for debugging and as a fallback.
+            products: Optional[List[Dict[str, Any]]] = None
+            if not DEBUG:
+                try:
+                    products = await page.evaluate(_EXTRACT_PRODUCTS_JS, _ITEM_FIELDS)
+                except Exception as e:
+                    print(f"In-page extraction failed ({e}); parsing raw data instead.")
+
+            if products is None:
+                script = page.locator("script#__NEXT_DATA__")
+                # textContent skips inner_text's layout-aware whitespace handling
+                raw_json = await script.evaluate("e => e.textContent")
+                await _debug_dump("debug_superstore_raw.json", raw_json[:50000])
+
+                # Multi-MB parse + walk runs off the event loop so concurrent scrapes keep moving
+                data, products = await asyncio.to_thread(_parse_and_collect, raw_json)
+
+                if not isinstance(data, dict):
+                    print("Error: could not parse Next.js data blob.")
+                    return []
+
+                # Basic structure probes for debugging
+                if DEBUG:
+                    props = data.get("props", {})
+                    page_props = props.get("pageProps", {}) if isinstance(props, dict) else {}
+                    print(f"Top-level keys: {list(data.keys())}")
+                    print(f"props keys: {list(props.keys()) if isinstance(props, dict) else []}")
+                    print(f"pageProps keys: {list(page_props.keys()) if isinstance(page_props, dict) else []}")
+
+                    initial_search = _search_subtree(data)
+                    if initial_search is not None:
+                        await _debug_dump("debug_superstore_initial.json", initial_search)
 
-            products = _collect_products(data)
             if not products:
                 print("Warning: no product-like objects found in parsed data.")
 
             results: List[Dict[str, Any]] = []
             debug: List[Dict[str, Any]] = []
             seen: set[str] = set()
+            # Locals avoid a global/attribute lookup per product on big result pages
+            seen_add = seen.add
+            results_append = results.append
+            unique_identifier = _unique_identifier
+            extract_all = _extract_all
 
             for item in products:
                 if not isinstance(item, dict):
@@ -325,57 +629,78 @@ async def scrape_superstore(search_term: str, postal_code: str = DEFAULT_POSTAL_
                 if not isinstance(name, str):
                     continue
 
-                pid = _unique_identifier(item)
+                pid = unique_identifier(item, name)
                 if pid in seen:
                     continue
-                seen.add(pid)
-
-                price, unit_price = _extract_price_fields(item)
-                available = _is_available(item)
-                quantity = _extract_quantity(item)
-
-                results.append(
-                    {
-                        "name": name,
-                        "price": price,
-                        "unit_price": unit_price,
-                        "quantity": quantity,
-                        "available": available,
-                    }
-                )
-
-                debug.append(
-                    {
-                        "id": pid,
-                        "name": name,
-                        "has_price": price is not None,
-                        "unit_price": unit_price,
-                        "availabilityStatus": item.get("availabilityStatus"),
-                        "keys": sorted(list(item.keys())),
-                    }
-                )
+                seen_add(pid)
+
+                record = extract_all(item, name)
+                results_append(record)
+
+                if DEBUG:
+                    debug.append(
+                        {
+                            "id": pid,
+                            "name": name,
+                            "has_price": record["price"] is not None,
+                            "unit_price": record["unit_price"],
+                            "availabilityStatus": item.get("availabilityStatus"),
+                            "keys": sorted(list(item.keys())),
+                        }
+                    )
 
             print(f"Superstore: extracted {len(results)} items (unique by id/name).")
-            try:
-                with open("debug_superstore.json", "w", encoding="utf-8") as df:
-                    json.dump(debug, df, indent=2, ensure_ascii=False)
-                print("Wrote debug_superstore.json for inspection.")
-            except Exception as e:
-                print(f"Failed to write debug file: {e}")
-
-            await browser.close()
+            if results:
+                _CACHE[cache_key] = (time.monotonic(), [dict(item) for item in results])
+                # Re-save after every successful scrape, warm or not, so the stored
+                # cookies keep up with what the site last handed out
+                try:
+                    state = await context.storage_state()
+                    await asyncio.to_thread(_write_session, session_file, state)
+                except Exception as e:
+                    print(f"Could not save Superstore session: {e}")
+            await _debug_dump("debug_superstore.json", debug)
             return results
 
         except Exception as exc:
-            print(f"Superstore scraper error: {exc}")
-            traceback.print_exc()
-            await browser.close()
+            print(f"Superstore scraper error: {type(exc).__name__}: {exc}")
+            if DEBUG:
+                traceback.print_exc()
             return []
 
+    finally:
+        try:
+            await context.close()
+        except Exception:
+            pass
+
+
+async def scrape_superstore_many(
+    terms: List[str], postal_code: str = DEFAULT_POSTAL_CODE, concurrency: int = 4
+) -> List[List[Dict[str, Any]]]:
+    """
+    Scrape several search terms concurrently, each in its own context on the
+    shared browser. Results are returned in the same order as `terms`.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(term: str) -> List[Dict[str, Any]]:
+        async with semaphore:
+            return await scrape_superstore(term, postal_code)
+
+    return await asyncio.gather(*(one(term) for term in terms))
+
 
 if __name__ == "__main__":
     query = "milk"
-    output = asyncio.run(scrape_superstore(query))
+
+    async def _run_once() -> List[Dict[str, Any]]:
+        try:
+            return await scrape_superstore(query)
+        finally:
+            await close_superstore()
+
+    output = asyncio.run(_run_once())
     print(f"Found {len(output)} items for '{query}'. Showing first 10...")
     for entry in output[:10]:
         p = entry["price"]
@@ -1,10 +1,13 @@
 """Quick test to verify quantity extraction works."""
 import asyncio
-from superstore import scrape_superstore
+from superstore import close_superstore, scrape_superstore
 
 async def test():
     print("Testing quantity extraction with Superstore...")
-    results = await scrape_superstore("2% white milk")
+    try:
+        results = await scrape_superstore("2% white milk")
+    finally:
+        await close_superstore()
     
     print(f"\nFound {len(results)} items\n")
     for idx, item in enumerate(results[:5], 1):
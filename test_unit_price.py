@@ -0,0 +1,32 @@
+"""Check unit normalization for quantity strings with trailing words."""
+from integrate_scrapers import _calculate_unit_price, _parse_quantity_and_unit
+
+
+def _base_unit(quantity_str):
+    return _calculate_unit_price(4.0, _parse_quantity_and_unit(quantity_str))["base_unit"]
+
+
+def test_each_suffix_keeps_weight_unit():
+    assert _base_unit("454 g each") == "g"
+
+
+def test_pack_suffix_keeps_weight_unit():
+    assert _base_unit("500 g pack") == "g"
+    assert _base_unit("340 g package") == "g"
+
+
+def test_leading_unit_word_wins():
+    assert _base_unit("1 lb bag") == "lb"
+    assert _base_unit("2 kg tub") == "kg"
+
+
+def test_aliases_still_resolve_exactly():
+    assert _base_unit("2 litres") == "l"
+    assert _base_unit("6 pack") == "count"
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+            print(f"{name}: ok")
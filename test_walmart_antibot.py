@@ -1,10 +1,13 @@
 """Test enhanced Walmart scraper with anti-bot improvements."""
 import asyncio
-from walmart2 import scrape_walmart_cole_harbour
+from walmart2 import close_walmart, scrape_walmart_cole_harbour
 
 async def test_walmart():
     print("Testing enhanced Walmart scraper with improved anti-bot measures...\n")
-    results = await scrape_walmart_cole_harbour("2% milk")
+    try:
+        results = await scrape_walmart_cole_harbour("2% milk")
+    finally:
+        await close_walmart()
     
     print(f"\nFound {len(results)} items\n")
     for idx, item in enumerate(results[:5], 1):
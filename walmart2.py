@@ -1,12 +1,20 @@
 import json
 import asyncio
 import random
+import re
 import traceback
 import time
 import os
 from pathlib import Path
 from datetime import datetime, timedelta
+import aiohttp
 from playwright.async_api import async_playwright
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # REBROWSER-PLAYWRIGHT: This project uses rebrowser-playwright instead of regular playwright.
 # It's a drop-in replacement that patches 30+ browser automation detection vectors.
@@ -15,11 +23,191 @@ from playwright.async_api import async_playwright
 # Documentation: https://rebrowser.net/docs/patches-for-puppeteer-and-playwright
 # The patches are applied automatically at the binary level - no code changes needed!
 
+# Set WALMART_DEBUG=1 to write a per-item summary to debug_items.json after each scrape
+# and print full tracebacks for failed searches
+DEBUG = os.environ.get("WALMART_DEBUG") == "1"
+
 # Rate limiting configuration
-LAST_REQUEST_TIME = None
-MIN_REQUEST_INTERVAL = 45  # Minimum seconds between requests
+# Token bucket: one request per MIN_REQUEST_INTERVAL on average, with up to
+# RATE_LIMIT_BURST starting back to back. Back-to-back searches are what trip
+# Walmart's bot check, so the default burst of 1 keeps a strict gap between
+# searches; WALMART_RATE_LIMIT_BURST raises it at your own risk.
+MIN_REQUEST_INTERVAL = 45  # Average seconds between requests
+RATE_LIMIT_BURST = max(1, int(os.environ.get("WALMART_RATE_LIMIT_BURST", "1")))
+_RATE_TOKENS = float(RATE_LIMIT_BURST)
+_RATE_UPDATED = time.monotonic()
+_RATE_LIMIT_LOCK = asyncio.Lock()
+# After Walmart refuses the plain-HTTP probe, searches go straight to the
+# browser for this many seconds instead of repeating an already-flagged request
+HTTP_REFUSAL_COOLDOWN = 600
 SESSION_DIR = Path(__file__).parent / ".walmart_sessions"
 SESSION_DIR.mkdir(exist_ok=True)
+SESSION_FILE = SESSION_DIR / "walmart_session.json"
+
+# Walmart's "Press & Hold" check needs a person at a visible window, so the
+# browser is headful by default. WALMART_HEADLESS=1 hides it (bot checks then
+# fail the search instead of waiting for a solve).
+HEADLESS = os.environ.get("WALMART_HEADLESS") == "1"
+# Browser contexts open at once on the shared Chromium; each costs tens of MB,
+# so lower WALMART_MAX_CONTEXTS on small machines
+MAX_CONTEXTS = max(1, int(os.environ.get("WALMART_MAX_CONTEXTS", "4")))
+LAUNCH_ARGS = [
+    "--disable-blink-features=AutomationControlled",
+    "--disable-dev-shm-usage",
+    "--no-first-run",
+    "--no-default-browser-check",
+    "--disable-infobars",
+    "--disable-background-timer-throttling",
+    "--disable-backgrounding-occluded-windows",
+    "--disable-renderer-backgrounding",
+    "--blink-settings=imagesEnabled=false",
+]
+
+# Only __NEXT_DATA__ is read, so skip the heavy assets and third-party trackers.
+# Stylesheets and first-party scripts still load: the bot-check widget needs
+# both to render for someone to solve it.
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "media", "font"})
+BLOCKED_HOSTS_RE = re.compile(
+    r"https?://[^/]*(?:google-analytics|googletagmanager|doubleclick|facebook|criteo"
+    r"|quantummetric|hotjar|bing|segment|tealiumiq|tiqcdn)\.",
+    re.IGNORECASE,
+)
+
+# Store #1176 (Cole Harbour) and its postal code
+COLE_HARBOUR_COOKIES = {"walmart.id": "1176", "locDataV3": "B2V2J5"}
+# Both run over the raw response bytes; the HTML is never decoded just to be searched
+NEXT_DATA_RE = re.compile(
+    rb'<script[^>]*id="__NEXT_DATA__"[^>]*>(.*?)</script>', re.DOTALL
+)
+BLOCKED_PHRASES = (
+    "press & hold",
+    "verify you are human",
+    "robot or human",
+    "access to this page has been denied",
+    "unusual traffic from your computer",
+    "we detected unusual traffic",
+)
+# One alternation serves both the raw-HTML check and the in-page check. Words
+# may be split by any whitespace (markup line breaks) and "&" may still be
+# entity-encoded in raw HTML; the phrases are plain words, so no escaping is needed.
+_BLOCKED_PATTERN = "|".join(
+    r"\s+".join("(?:&|&amp;)" if word == "&" else word for word in phrase.split())
+    for phrase in BLOCKED_PHRASES
+)
+_BLOCKED_RE = re.compile(_BLOCKED_PATTERN.encode(), re.IGNORECASE)
+# Evaluated inside the page by wait_for_function, so polling never ships the DOM over CDP.
+# A single case-insensitive regex test scans the text once without a lowercased copy.
+_CAPTCHA_JS = (
+    "() => /" + _BLOCKED_PATTERN + "/i.test((document.body && document.body.innerText) || '')"
+)
+# Client-side searches (Next.js data route or the search GraphQL call) carry the
+# same item stacks as __NEXT_DATA__; these are where each response keeps them.
+_SEARCH_XHR_RE = re.compile(r"/orchestra/snb/graphql/search|/_next/data/[^?]*/search\.json", re.IGNORECASE)
+_SEARCH_STACKS_PATH = ("props", "pageProps", "initialData", "searchResult", "itemStacks")
+_XHR_STACK_PATHS = (
+    ("pageProps", "initialData", "searchResult", "itemStacks"),
+    ("data", "search", "searchResult", "itemStacks"),
+)
+# How long a human gets to solve a captcha in the headful window
+CAPTCHA_TIMEOUT_MS = 120000
+_QTY_RE = re.compile(r'(\d+\s*(?:L|ML|g|kg|oz|lb|pack|count|piece))', re.IGNORECASE)
+# "available online" is covered by "available"; matched case-insensitively so
+# messages needn't be lowercased first
+_AVAIL_RE = re.compile(r"in stock|available|add to cart", re.IGNORECASE)
+_CURRENCY_RE = re.compile(r"\$|CAD|USD|,")
+# A plain amount: digits with at most one decimal point. float() alone would
+# also take "nan", "inf", "-3" and "1e5".
+_AMOUNT_RE = re.compile(r"\d+\.?\d*|\.\d+")
+_INVENTORY_COUNT_KEYS = ("availableQuantity", "quantity", "stock", "available")
+_QTY_KEYS = ("packageSizing", "size", "quantity", "format", "packaging", "unitQuantity", "volumePrice")
+# Status strings are upper-cased once per item and probed against these
+_IN_STOCK_STATUSES = frozenset({"IN_STOCK", "INSTOCK", "AVAILABLE", "IN_STORE", "IN_STORE_ONLY"})
+_OFFER_IN_STOCK = frozenset({"IN_STOCK", "INSTOCK", "AVAILABLE", "IN_STOCK_ONLINE"})
+_FIRST_OFFER_IN_STOCK = frozenset({"IN_STOCK", "INSTOCK", "AVAILABLE"})
+_OUT_FLAGS = frozenset({"OUT_OF_STOCK", "SOLD_OUT", "UNAVAILABLE", "COMING_SOON"})
+
+# How many missing-price identifiers the per-scrape debug line lists
+_MISSING_PRICE_SAMPLE = 20
+# Identifier fields tried in order for debug output
+_ID_KEYS = ("sku", "productId", "id")
+# Looked up once per item and shared by the price and availability checks
+_OFFER_KEYS = ("offers", "offer")
+# Alternative names for the same field, read by the availability rules and the debug summary
+_INVENTORY_KEYS = ("inventory", "inventoryInfo", "inStoreAvailability")
+_AVAIL_MSG_KEYS = ("availabilityMessage", "availabilityText", "availability")
+
+# Where a price can live, in priority order: (path starts at the item's offers
+# rather than the item, path, keys read from a dict found there, whether a bare
+# value there counts as the price). See _walk for path steps.
+_PRICE_VALUE_KEYS = ("price", "value", "priceString")
+_OFFER_PRICE_KEYS = ("price", "priceString", "amount")
+_PRICE_PATHS = (
+    (False, ("priceInfo", ("currentPrice", "price")), _PRICE_VALUE_KEYS, True),
+    (False, ("priceInfo", "linePrice"), _PRICE_VALUE_KEYS, False),
+    (True, (), _OFFER_PRICE_KEYS, False),
+    (True, (0,), _OFFER_PRICE_KEYS, False),
+    (False, ("productPrice",), _PRICE_VALUE_KEYS, True),
+    (False, ("sellingPrice",), _PRICE_VALUE_KEYS, True),
+    (False, ("price",), _PRICE_VALUE_KEYS, True),
+    (False, ("salePrice",), _PRICE_VALUE_KEYS, True),
+)
+_UNIT_PRICE_KEYS = ("priceString", "price", "value")
+_NESTED_PRICE_KEYS = ("price", "value", "amount")
+# Parse __NEXT_DATA__ in the page and hand back only the Product items of the search
+# stacks, folded into one stack, so the layout/i18n/tracking siblings and the ad tiles
+# never cross the wire or become Python objects. null means the tag is missing or not
+# clean JSON; the caller then salvages the raw text.
+_ITEM_STACKS_JS = """(fields) => {
+    const el = document.getElementById('__NEXT_DATA__');
+    if (!el) return null;
+    try {
+        const data = JSON.parse(el.textContent);
+        const stacks = data?.props?.pageProps?.initialData?.searchResult?.itemStacks;
+        if (!Array.isArray(stacks) || stacks.length === 0) return [];
+        const items = [];
+        for (const stack of stacks) {
+            for (const item of stack.items || []) {
+                if (item && typeof item === 'object' && !Array.isArray(item) && item.__typename === 'Product') {
+                    if (!fields) {
+                        items.push(item);
+                        continue;
+                    }
+                    const slim = {};
+                    for (const k of fields) {
+                        if (k in item) slim[k] = item[k];
+                    }
+                    items.push(slim);
+                }
+            }
+        }
+        return [{ items }];
+    } catch (e) {
+        return null;
+    }
+}"""
+
+
+def _loads(raw):
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _dump_json_file(obj, path):
+    if orjson is not None:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=2, ensure_ascii=False)
+
+
+async def _block_assets(route):
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or BLOCKED_HOSTS_RE.match(request.url):
+        await route.abort()
+    else:
+        await route.continue_()
 
 
 async def _safe_close(context=None, browser=None):
@@ -33,29 +221,46 @@ async def _safe_close(context=None, browser=None):
 
 
 async def _check_rate_limit():
-    """Enforce rate limiting between requests."""
-    global LAST_REQUEST_TIME
-    if LAST_REQUEST_TIME:
-        elapsed = time.time() - LAST_REQUEST_TIME
-        if elapsed < MIN_REQUEST_INTERVAL:
-            wait_time = MIN_REQUEST_INTERVAL - elapsed + random.uniform(5, 15)
-            print(f"Rate limiting: waiting {wait_time:.1f}s before next request...")
-            await asyncio.sleep(wait_time)
-    LAST_REQUEST_TIME = time.time()
-
-
-async def _simulate_human_behavior(page):
-    """Simulate realistic human browsing behavior."""
+    """Enforce rate limiting between requests.
+
+    Each caller reserves a token under the lock, then sleeps outside it, so
+    concurrent callers get successive slots instead of all starting together
+    and no one holds the lock while waiting.
+    """
+    global _RATE_TOKENS, _RATE_UPDATED
+    async with _RATE_LIMIT_LOCK:
+        now = time.monotonic()
+        refill = (now - _RATE_UPDATED) / MIN_REQUEST_INTERVAL
+        _RATE_TOKENS = min(float(RATE_LIMIT_BURST), _RATE_TOKENS + refill)
+        _RATE_UPDATED = now
+        _RATE_TOKENS -= 1
+        # A negative balance is the queue ahead of us, in request-intervals
+        wait_time = -_RATE_TOKENS * MIN_REQUEST_INTERVAL if _RATE_TOKENS < 0 else 0.0
+    if wait_time > 0:
+        wait_time += random.uniform(5, 15)
+        print(f"Rate limiting: waiting {wait_time:.1f}s before next request...")
+        await asyncio.sleep(wait_time)
+
+
+async def _simulate_human_behavior(page, brief=False):
+    """Simulate realistic human browsing behavior; brief=True is a single scroll."""
     # Random scrolling
     scroll_amount = random.randint(200, 800)
-    await page.evaluate(f"window.scrollBy(0, {scroll_amount})")
-    await asyncio.sleep(random.uniform(0.5, 1.5))
-    
-    # Scroll back up a bit
-    await page.evaluate(f"window.scrollBy(0, -{scroll_amount // 2})")
-    await asyncio.sleep(random.uniform(0.3, 0.8))
+    if brief:
+        await page.evaluate(f"window.scrollBy(0, {scroll_amount})")
+        await asyncio.sleep(random.uniform(0.5, 1.5))
+        return
+
+    # Scroll down, then back up a bit on the page's own timer: one round trip
+    pause_ms = random.randint(500, 1500)
+    await page.evaluate(
+        f"window.scrollBy(0, {scroll_amount});"
+        f"setTimeout(() => window.scrollBy(0, -{scroll_amount // 2}), {pause_ms})"
+    )
+    await asyncio.sleep(pause_ms / 1000 + random.uniform(0.3, 0.8))
     
-    # Random mouse movement
+    # Random mouse movement. Kept as real input events: mousemove events
+    # dispatched from script are marked untrusted, which bot checks look for.
     try:
         viewport_size = page.viewport_size
         if viewport_size:
@@ -102,303 +307,658 @@ USER_AGENTS = [
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.6778.86 Safari/537.36",
 ]
 
-def _get_realistic_headers():
-    """Generate realistic HTTP headers."""
-    return {
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8",
-        "Accept-Encoding": "gzip, deflate, br",
-        "Accept-Language": "en-US,en;q=0.9",
-        "Cache-Control": "max-age=0",
-        "Sec-Ch-Ua": '"Not_A Brand";v="8", "Chromium";v="131", "Google Chrome";v="131"',
-        "Sec-Ch-Ua-Mobile": "?0",
-        "Sec-Ch-Ua-Platform": '"Windows"',
-        "Sec-Fetch-Dest": "document",
-        "Sec-Fetch-Mode": "navigate",
-        "Sec-Fetch-Site": "none",
-        "Sec-Fetch-User": "?1",
-        "Upgrade-Insecure-Requests": "1",
-    }
+# Realistic browser request headers. Shared as-is by every context (Playwright
+# only reads them); the HTTP session takes its own trimmed copy.
+_BASE_HEADERS = {
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8",
+    "Accept-Encoding": "gzip, deflate, br",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Cache-Control": "max-age=0",
+    "Sec-Ch-Ua": '"Not_A Brand";v="8", "Chromium";v="131", "Google Chrome";v="131"',
+    "Sec-Ch-Ua-Mobile": "?0",
+    "Sec-Ch-Ua-Platform": '"Windows"',
+    "Sec-Fetch-Dest": "document",
+    "Sec-Fetch-Mode": "navigate",
+    "Sec-Fetch-Site": "none",
+    "Sec-Fetch-User": "?1",
+    "Upgrade-Insecure-Requests": "1",
+}
 
+# Random viewport to avoid fingerprinting
+_VIEWPORT_WIDTHS = (1366, 1920, 1440, 1536, 1280)
+_VIEWPORT_HEIGHTS = (768, 1024, 864, 720)
+# Context options that are the same for every search
+_STATIC_CONTEXT_OPTIONS = {
+    "device_scale_factor": 1,
+    "extra_http_headers": _BASE_HEADERS,
+    "ignore_https_errors": True,
+    "locale": "en-CA",
+    "timezone_id": "America/Halifax",
+}
 
-async def scrape_walmart_cole_harbour(search_term, use_persistent_session=True):
-    """Scrape Walmart with anti-detection measures.
+
+def _extract_quantity(item: dict):
+    """Extract package size/quantity information."""
+    # Try several paths for quantity/size info
+    for key in _QTY_KEYS:
+        val = item.get(key)
+        if isinstance(val, str):
+            val = val.strip()
+            if val:
+                return val
     
-    Args:
-        search_term: Product search query
-        use_persistent_session: If True, reuse browser session/cookies
+    # Try extracting from name as fallback
+    name = item.get("name", "")
+    if name:
+        # Look for common patterns: "2L", "1L", "6 pack", "12 count", etc.
+        match = _QTY_RE.search(name)
+        if match:
+            return match.group(1)
+    
+    return None
+
+
+def _or_get(d, keys):
+    """d.get(k1) or d.get(k2) or ...: the first truthy value, else the last one looked up."""
+    v = None
+    for k in keys:
+        v = d.get(k)
+        if v:
+            return v
+    return v
+
+
+def _walk(obj, path):
+    """Follow path through nested data; None as soon as a step doesn't fit.
+
+    A str step reads a dict key, a tuple step is an `or` chain over dict keys,
+    and an int step indexes a non-empty list.
     """
-    # Enforce rate limiting
-    await _check_rate_limit()
+    for step in path:
+        if isinstance(step, int):
+            if not isinstance(obj, list) or len(obj) <= step:
+                return None
+            obj = obj[step]
+        elif isinstance(obj, dict):
+            obj = _or_get(obj, step) if isinstance(step, tuple) else obj.get(step)
+        else:
+            return None
+    return obj
+
+
+def _extract_price_and_unit(item: dict, offers):
+    """Try several known paths to extract a numeric price and unit price string.
+
+    `offers` is the item's offers/offer value, looked up once by the caller.
+    """
+    price = None
+    for on_offers, path, keys, allow_scalar in _PRICE_PATHS:
+        node = _walk(offers if on_offers else item, path)
+        if isinstance(node, dict):
+            price = _or_get(node, keys)
+        elif allow_scalar:
+            price = node
+        if price is not None:
+            break
+
+    unit_price = None
+    unit = _walk(item, ("priceInfo", "unitPrice"))
+    if isinstance(unit, dict):
+        unit_price = _or_get(unit, _UNIT_PRICE_KEYS)
+
+    # Normalize price: unwrap dicts, strip currency, convert to float when possible
+    if isinstance(price, dict):
+        price = _or_get(price, _NESTED_PRICE_KEYS)
+
+    if isinstance(price, str):
+        # Drop currency markers and thousands separators in one pass
+        p = _CURRENCY_RE.sub("", price).strip()
+        # Keep plain amounts only; anything the pattern accepts parses as a float
+        if _AMOUNT_RE.fullmatch(p):
+            price = float(p)
+
+    return price, unit_price
+
+
+def _is_true(v):
+    return v is True
+
+
+def _has_stock_count(inv):
+    if isinstance(inv, dict):
+        for key in _INVENTORY_COUNT_KEYS:
+            v = inv.get(key)
+            try:
+                if isinstance(v, (int, float)) and v > 0:
+                    return True
+                if isinstance(v, str) and v.isdigit() and int(v) > 0:
+                    return True
+            except Exception:
+                pass
+    return False
+
+
+def _offer_available(statuses):
+    def check(offer):
+        if not isinstance(offer, dict):
+            return False
+        av = _or_get(offer, ("availability", "availabilityStatus"))
+        return (isinstance(av, str) and av.upper() in statuses) or offer.get("isAvailable") is True
+    return check
+
+
+def _can_fulfil(fulfil):
+    return isinstance(fulfil, dict) and (
+        fulfil.get("isAvailable") is True or fulfil.get("isFulfillable") is True
+    )
+
+
+def _mentions_available(msg):
+    return isinstance(msg, str) and _AVAIL_RE.search(msg) is not None
+
+
+# (path starts at the offers, path, test): any passing rule means available.
+# Ordered by how often each signal is present on Walmart items.
+_AVAILABILITY_RULES = (
+    # Explicit add-to-cart / buy flags — treat these as positive availability
+    (False, ("canAddToCart",), _is_true),
+    (False, ("showAtc",), _is_true),
+    (False, ("showBuyNow",), _is_true),
+    # Boolean stock flags
+    (False, ("isInStock",), _is_true),
+    (False, ("isAvailable",), _is_true),
+    # Offers / fulfillment
+    (True, (), _offer_available(_OFFER_IN_STOCK)),
+    (True, (0,), _offer_available(_FIRST_OFFER_IN_STOCK)),
+    (False, (("fulfillment", "fulfillmentInfo", "fulfillmentOptions"),), _can_fulfil),
+    # Inventory counts
+    (False, (_INVENTORY_KEYS,), _has_stock_count),
+    # Textual availability messages
+    (False, (_AVAIL_MSG_KEYS,), _mentions_available),
+)
+
+
+def _top_keys(path):
+    step = path[0] if path else None
+    return (step,) if isinstance(step, str) else step if isinstance(step, tuple) else ()
+
+
+# Every top-level item field the extractors read. The in-page projection sends
+# only these back over CDP instead of whole product objects.
+_ITEM_FIELDS = list(dict.fromkeys((
+    "__typename", "name", *_ID_KEYS,
+    "isOutOfStock", "availabilityStatus", "priceInfo", "price",
+    *_OFFER_KEYS,
+    *_QTY_KEYS,
+    *(k for on_offers, path, *_ in _PRICE_PATHS if not on_offers for k in _top_keys(path)),
+    *(k for on_offers, path, _ in _AVAILABILITY_RULES if not on_offers for k in _top_keys(path)),
+)))
+
+
+def _extract_availability(item: dict, offers):
+    """Decide whether the item can be bought; `offers` as for _extract_price_and_unit."""
+    # Explicit negative flag
+    if item.get("isOutOfStock") is True:
+        return False
+
+    # Nearly every item carries a status string, so settle those before walking the rest
+    status = item.get("availabilityStatus")
+    status = status.upper() if isinstance(status, str) else None
+    if status in _IN_STOCK_STATUSES:
+        return True
+
+    for on_offers, path, test in _AVAILABILITY_RULES:
+        if test(_walk(offers if on_offers else item, path)):
+            return True
+
+    # If we have price/offer and no explicit out-of-stock, be permissive
+    if (item.get("priceInfo") or item.get("price") or item.get("offers")) and status not in _OUT_FLAGS:
+        return True
+
+    # Default: not available
+    return False
+
+
+def _session_is_warm(storage_state):
+    """True if the saved state still holds an unexpired walmart.ca cookie."""
+    if not storage_state:
+        return False
+    now = time.time()
+    return any(
+        c.get("domain", "").endswith("walmart.ca") and c.get("expires", -1) > now
+        for c in storage_state.get("cookies", ())
+    )
+
+
+def _search_url(search_term):
+    return f"https://www.walmart.ca/search?q={search_term.replace(' ', '%20')}"
+
+
+def _parse_next_data(raw):
+    """Parse the __NEXT_DATA__ text or bytes, salvaging the outermost {...} if it is wrapped in junk."""
+    # orjson reads str as readily as bytes; only the salvage scan needs bytes
+    try:
+        return _loads(raw)
+    except Exception:
+        pass
+    if isinstance(raw, str):
+        raw = raw.encode("utf-8", "replace")
+    # bytes.find/rfind are C-level scans; orjson can parse a memoryview slice without a copy
+    start = raw.find(b'{')
+    end = raw.rfind(b'}')
+    if start != -1 and end != -1:
+        try:
+            return _loads(memoryview(raw)[start:end+1] if orjson is not None else raw[start:end+1])
+        except Exception:
+            return None
+    return None
+
+
+def _item_identifier(item, name):
+    return _or_get(item, _ID_KEYS) or name
+
+
+def _build_results(data):
+    """Turn parsed __NEXT_DATA__ into (results, debug_items); None if the search payload is missing."""
+    return _build_results_from_stacks(_walk(data, _SEARCH_STACKS_PATH))
+
+
+def _build_results_from_stacks(item_stacks):
+    """Same as _build_results, starting from searchResult.itemStacks."""
+    try:
+        if not item_stacks:
+            print("No product stacks found.")
+            return None
+
+        # Ads, banners and other tiles are dropped while the stacks are flattened
+        items = [
+            item
+            for stack in item_stacks
+            for item in stack.get('items', ())
+            if isinstance(item, dict) and item.get("__typename") == "Product"
+        ]
+            
+    except Exception as e:
+        print(f"JSON structure error: {e}")
+        return None
     
-    context = None
-    browser = None
-    async with async_playwright() as p:
+    results = []
+    debug_items = []
+    missing_price = []
+    missing_count = 0
+    # Rows stay plain dicts (callers index them by key and attach their own
+    # fields); just keep the attribute lookups out of the per-item loop.
+    add_result = results.append
+    add_debug = debug_items.append
+    for item in items:
+        name = item.get("name")
+        offers = _or_get(item, _OFFER_KEYS)
+        price, unit_price = _extract_price_and_unit(item, offers)
+        available = _extract_availability(item, offers)
+        quantity = _extract_quantity(item)
+
+        # Note items still missing a price; reported in one line after the loop.
+        # Identifiers are only looked up for the few that get printed or dumped.
+        identifier = None
+        if price is None:
+            missing_count += 1
+            if missing_count <= _MISSING_PRICE_SAMPLE:
+                identifier = _item_identifier(item, name)
+                missing_price.append(str(identifier))
+
+        add_result({
+            "name": name,
+            "price": price,
+            "unit_price": unit_price,
+            "quantity": quantity,
+            "available": available
+        })
+        # Collect a small debug summary (no large payloads)
+        if DEBUG:
+            add_debug({
+                "identifier": identifier if identifier is not None else _item_identifier(item, name),
+                "name": name,
+                "keys": tuple(item),
+                "price": price,
+                "unit_price": unit_price,
+                "availabilityStatus": item.get("availabilityStatus"),
+                "offers_present": isinstance(offers, (dict, list)),
+                "inventory_present": bool(_or_get(item, _INVENTORY_KEYS)),
+                "availabilityMessage": _or_get(item, _AVAIL_MSG_KEYS),
+            })
+
+    if missing_count:
+        hint = " (keys in debug_items.json)" if DEBUG else ""
+        print(f"Debug: missing price for {missing_count} items{hint}: {', '.join(missing_price)}")
+    print(f"Successfully retrieved {len(results)} items.")
+    return results, debug_items
+
+
+async def _debug_dump(path, data):
+    """Write a debug artifact off the event loop; no-op unless DEBUG is set."""
+    if not DEBUG:
+        return
+    try:
+        await asyncio.to_thread(_dump_json_file, data, path)
+        print(f"Wrote {path} for inspection.")
+    except Exception as e:
+        print(f"Failed to write {path}: {e}")
+
+
+def _parse_and_build(raw):
+    """Parse raw __NEXT_DATA__ text or bytes and build results; safe to run in a thread."""
+    data = _parse_next_data(raw)
+    if not isinstance(data, dict):
+        print(f"Error: Parsed data is {type(data)}.")
+        return None
+    return _build_results(data)
+
+
+def _results_from_search_json(raw):
+    """Build results from a search XHR body; None if it isn't a search payload. Thread-safe."""
+    try:
+        data = _loads(raw)
+    except Exception:
+        return None
+    for path in _XHR_STACK_PATHS:
+        item_stacks = _walk(data, path)
+        if item_stacks:
+            return _build_results_from_stacks(item_stacks)
+    return None
+
+
+def _results_from_html(html):
+    """Pull __NEXT_DATA__ out of search HTML bytes and build results; safe to run in a thread.
+
+    Returns (built, blocked): built is None when the page has no usable data,
+    and blocked says whether that is because Walmart served a bot check.
+    """
+    match = NEXT_DATA_RE.search(html)
+    if not match:
+        if _BLOCKED_RE.search(html):
+            print("HTTP fetch hit a bot check; falling back to browser.")
+            return None, True
+        return None, False
+    return _parse_and_build(match.group(1)), False
+
+
+async def _fetch_search_html(http, search_term):
+    """GET the search page over plain HTTP.
+
+    Returns None when Walmart refuses the request, so the caller can fall
+    back to the browser.
+    """
+    try:
+        async with http.get(_search_url(search_term)) as resp:
+            if resp.status != 200:
+                print(f"HTTP fetch got status {resp.status}; falling back to browser.")
+                return None
+            return await resp.read()
+    except Exception as e:
+        print(f"HTTP fetch failed ({e}); falling back to browser.")
+        return None
+
+
+async def _wait_for_data_or_captcha(page, timeout, watch_captcha=True):
+    """
+    Race the data tag attaching against a bot-check message rendering.
+    Returns "data", "captcha" or "timeout"; the losing wait is cancelled.
+    """
+    data_wait = asyncio.ensure_future(
+        page.wait_for_selector("script#__NEXT_DATA__", state="attached", timeout=timeout)
+    )
+    waits = {data_wait}
+    captcha_wait = None
+    if watch_captcha:
+        captcha_wait = asyncio.ensure_future(page.wait_for_function(_CAPTCHA_JS, timeout=timeout))
+        waits.add(captcha_wait)
+
+    pending = waits
+    outcome = "timeout"
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if data_wait in done and data_wait.exception() is None:
+                outcome = "data"
+                break
+            if captcha_wait is not None and captcha_wait in done and captcha_wait.exception() is None:
+                outcome = "captcha"
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+        # Retrieve every result so timeouts/cancellations aren't reported as unhandled
+        await asyncio.gather(*waits, return_exceptions=True)
+    return outcome
+
+
+class WalmartScraper:
+    """
+    Holds one aiohttp session, Playwright driver and Chromium instance for
+    many searches. Each search is first tried over plain HTTP; only when that
+    is refused does it get a fresh browser context (own viewport, user agent
+    and cookies), closed when the search finishes. Everything stays up until close().
+
+        async with WalmartScraper(concurrency=2) as scraper:
+            results = await asyncio.gather(*[scraper.scrape(q) for q in queries])
+    """
+
+    def __init__(self, concurrency: int = 1, headless: bool = HEADLESS):
+        self.concurrency = concurrency
+        self.headless = headless
+        self._pw = None
+        self._browser = None
+        self._loop = None
+        self._lock = None
+        self._semaphore = None
+        self._http = None
+        self._storage_state = None
+        self._http_refused_until = 0.0
+
+    async def __aenter__(self):
+        await self._start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Playwright and aiohttp objects are bound to the loop that created
+            # them; a fresh asyncio.run() needs a fresh browser and session.
+            self._loop = loop
+            self._lock = asyncio.Lock()
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._pw = None
+            self._browser = None
+            self._http = None
+
+    async def _start(self):
+        self._bind_loop()
+        async with self._lock:
+            if self._browser is not None and self._browser.is_connected():
+                return self._browser
+            if self._pw is None:
+                self._pw = await async_playwright().start()
+            self._browser = await self._pw.chromium.launch(headless=self.headless, args=LAUNCH_ARGS)
+            return self._browser
+
+    async def _session_state(self):
+        """Saved storage state: read from SESSION_FILE once, then kept current by _search."""
+        if self._storage_state is None and SESSION_FILE.exists():
+            try:
+                # Off the event loop so concurrent searches aren't stalled on disk
+                raw = await asyncio.to_thread(SESSION_FILE.read_bytes)
+                self._storage_state = _loads(raw)
+                print("Loaded persistent browser session")
+            except Exception as e:
+                print(f"Could not load session: {e}")
+        return self._storage_state
+
+    async def _http_session(self):
+        """One aiohttp session per loop so DNS, TLS and keep-alive connections are reused."""
+        self._bind_loop()
+        if self._http is None or self._http.closed:
+            headers = dict(_BASE_HEADERS)
+            # aiohttp negotiates compression itself and may lack a brotli decoder
+            headers.pop("Accept-Encoding", None)
+            headers["User-Agent"] = random.choice(USER_AGENTS)
+            # Sustained searches are spaced ~MIN_REQUEST_INTERVAL seconds apart, well past aiohttp's
+            # default 15s keep-alive and 10s DNS cache; stretch both so the next search
+            # reuses the resolved address and the open TLS connection.
+            connector = aiohttp.TCPConnector(
+                keepalive_timeout=MIN_REQUEST_INTERVAL + 30,
+                ttl_dns_cache=600,
+            )
+            self._http = aiohttp.ClientSession(
+                connector=connector,
+                headers=headers,
+                # Store cookies only. The browser's saved session stays out of
+                # the plain-HTTP probe: if Walmart flags the probe, it would burn
+                # those cookies and the browser would then reuse flagged state.
+                cookies=COLE_HARBOUR_COOKIES,
+                timeout=aiohttp.ClientTimeout(total=20),
+            )
+        return self._http
+
+    async def close(self):
+        browser, pw, http = self._browser, self._pw, self._http
+        self._browser = None
+        self._pw = None
+        self._http = None
+        if http is not None:
+            try:
+                await http.close()
+            except Exception:
+                pass
+        await _safe_close(browser=browser)
+        if pw is not None:
+            try:
+                await pw.stop()
+            except Exception:
+                pass
+
+    async def _new_context(self, use_persistent_session):
+        browser = await self._start()
         selected_user_agent = random.choice(USER_AGENTS)
-        
-        # Launch browser with anti-detection settings
-        browser = await p.chromium.launch(
-            headless=False,
-            args=[
-                "--disable-blink-features=AutomationControlled",
-                "--disable-dev-shm-usage",
-                "--no-first-run",
-                "--no-default-browser-check",
-                "--disable-infobars",
-                "--disable-background-timer-throttling",
-                "--disable-backgrounding-occluded-windows",
-                "--disable-renderer-backgrounding",
-            ]
-        )
-        
-        # Random viewport to avoid fingerprinting
-        viewport_widths = [1366, 1920, 1440, 1536, 1280]
-        viewport_heights = [768, 1024, 864, 720]
-        selected_width = random.choice(viewport_widths)
-        selected_height = random.choice(viewport_heights)
-        
-        # Set up persistent session path
-        session_file = SESSION_DIR / "walmart_session.json"
-        
+
         context_options = {
+            **_STATIC_CONTEXT_OPTIONS,
             "user_agent": selected_user_agent,
-            "viewport": {'width': selected_width, 'height': selected_height},
-            "device_scale_factor": 1,
-            "extra_http_headers": _get_realistic_headers(),
-            "ignore_https_errors": True,
-            "locale": "en-CA",
-            "timezone_id": "America/Halifax",
+            "viewport": {
+                'width': random.choice(_VIEWPORT_WIDTHS),
+                'height': random.choice(_VIEWPORT_HEIGHTS),
+            },
         }
         
-        # Load persistent session if available
-        if use_persistent_session and session_file.exists():
-            try:
-                with open(session_file, 'r') as f:
-                    storage_state = json.load(f)
-                context_options["storage_state"] = storage_state
-                print("Loaded persistent browser session")
-            except Exception as e:
-                print(f"Could not load session: {e}")
+        # Reuse the persistent session if available
+        storage_state = await self._session_state() if use_persistent_session else None
+        if storage_state is not None:
+            context_options["storage_state"] = storage_state
         
         context = await browser.new_context(**context_options)
+        await context.route("**/*", _block_assets)
         
         # Add anti-detection cookies
         await context.add_cookies([
-            {
-                "name": "walmart.id",
-                "value": "1176",
-                "domain": ".walmart.ca",
-                "path": "/"
-            },
-            {
-                "name": "locDataV3",
-                "value": "B2V2J5",
-                "domain": ".walmart.ca",
-                "path": "/"
-            }
+            {"name": name, "value": value, "domain": ".walmart.ca", "path": "/"}
+            for name, value in COLE_HARBOUR_COOKIES.items()
         ])
+        return context, selected_user_agent
+
+    async def scrape(self, search_term, use_persistent_session=True):
+        """Scrape Walmart with anti-detection measures.
         
-        page = await context.new_page()
-        
-        # NOTE: Stealth patches are applied automatically by rebrowser-playwright.
-        # No need for manual navigator.webdriver overrides or stealth plugins.
-        # The patched Chromium binary handles all anti-detection automatically.
+        Args:
+            search_term: Product search query
+            use_persistent_session: If True, reuse browser session/cookies
+        """
+        # Enforce rate limiting
+        await _check_rate_limit()
 
-        def _extract_quantity(item: dict):
-            """Extract package size/quantity information."""
-            import re
-            # Try several paths for quantity/size info
-            for key in ("packageSizing", "size", "quantity", "format", "packaging", "unitQuantity", "volumePrice"):
-                val = item.get(key)
-                if val and isinstance(val, str) and val.strip():
-                    return val.strip()
-            
-            # Try extracting from name as fallback
-            name = item.get("name", "")
-            if name:
-                # Look for common patterns: "2L", "1L", "6 pack", "12 count", etc.
-                match = re.search(r'(\d+\s*(?:L|ML|g|kg|oz|lb|pack|count|piece))', name, re.IGNORECASE)
-                if match:
-                    return match.group(1)
-            
-            return None
+        # Plain HTTP first: the search HTML carries the same __NEXT_DATA__
+        # without rendering anything. Only a refusal or bot check needs the browser.
+        if time.monotonic() >= self._http_refused_until:
+            html = await _fetch_search_html(await self._http_session(), search_term)
+            # Regex, parse and item walk are CPU-bound; keep them off the event loop
+            built, blocked = await asyncio.to_thread(_results_from_html, html) if html is not None else (None, True)
+            if built is not None:
+                results, debug_items = built
+                await _debug_dump("debug_items.json", debug_items)
+                return results
+            if blocked:
+                # The probe is flagged; retrying it each search would only add a
+                # second request per rate-limit slot ahead of the browser
+                self._http_refused_until = time.monotonic() + HTTP_REFUSAL_COOLDOWN
 
-        def _extract_price_and_unit(item: dict):
-            """Try several known paths to extract a numeric price and unit price string."""
-            price = None
-            unit_price = None
-
-            # Primary: priceInfo variations
-            price_info = item.get("priceInfo") or {}
-            if isinstance(price_info, dict):
-                # currentPrice may be dict or primitive
-                curr = price_info.get("currentPrice") or price_info.get("price")
-                if isinstance(curr, dict):
-                    price = curr.get("price") or curr.get("value") or curr.get("priceString")
-                elif curr is not None:
-                    price = curr
-
-                if price is None:
-                    line = price_info.get("linePrice")
-                    if isinstance(line, dict):
-                        price = line.get("price") or line.get("value") or line.get("priceString")
-
-                unit = price_info.get("unitPrice")
-                if isinstance(unit, dict):
-                    unit_price = unit.get("priceString") or unit.get("price") or unit.get("value")
-
-            # Secondary: offers / offer(s)
-            if price is None:
-                offers = item.get("offers") or item.get("offer")
-                if isinstance(offers, dict):
-                    price = offers.get("price") or offers.get("priceString") or offers.get("amount")
-                elif isinstance(offers, list) and offers:
-                    first = offers[0]
-                    if isinstance(first, dict):
-                        price = first.get("price") or first.get("priceString") or first.get("amount")
-
-            # Tertiary: other common keys
-            for candidate in ("productPrice", "sellingPrice", "price", "salePrice"):
-                if price is None:
-                    v = item.get(candidate)
-                    if isinstance(v, dict):
-                        price = v.get("price") or v.get("value") or v.get("priceString")
-                    elif v is not None:
-                        price = v
-
-            # Normalize price: unwrap dicts, strip currency, convert to float when possible
-            if isinstance(price, dict):
-                price = price.get("price") or price.get("value") or price.get("amount")
-
-            if isinstance(price, str):
-                p = price.strip()
-                # remove common currency symbols
-                for s in ("$", "CAD", "USD"):
-                    p = p.replace(s, "").strip()
-                try:
-                    if p.replace(',', '').replace('.', '').isdigit():
-                        price = float(p.replace(',', ''))
-                except Exception:
-                    pass
-
-            return price, unit_price
-
-        def _extract_availability(item: dict):
-            # Combine several possible flags to determine availability.
-            # 1) Explicit negative flag
-            if item.get("isOutOfStock") is True:
-                return False
-
-            # 2) Explicit add-to-cart / buy flags — treat these as positive availability
-            if item.get("canAddToCart") is True or item.get("showAtc") is True or item.get("showBuyNow") is True:
-                return True
-
-            # 3) Status strings and boolean flags
-            status = item.get("availabilityStatus")
-            if isinstance(status, str) and status.upper() in ("IN_STOCK", "INSTOCK", "AVAILABLE", "IN_STORE", "IN_STORE_ONLY"):
-                return True
-            if item.get("isInStock") is True or item.get("isAvailable") is True:
-                return True
-
-            # 4) Inventory counts
-            inv = item.get("inventory") or item.get("inventoryInfo") or item.get("inStoreAvailability")
-            if isinstance(inv, dict):
-                for key in ("availableQuantity", "quantity", "stock", "available"):
-                    v = inv.get(key)
-                    try:
-                        if isinstance(v, (int, float)) and v > 0:
-                            return True
-                        if isinstance(v, str) and v.isdigit() and int(v) > 0:
-                            return True
-                    except Exception:
-                        pass
-
-            # 5) Offers / fulfillment
-            offers = item.get("offers") or item.get("offer")
-            if isinstance(offers, dict):
-                av = offers.get("availability") or offers.get("availabilityStatus")
-                if isinstance(av, str) and av.upper() in ("IN_STOCK", "INSTOCK", "AVAILABLE", "IN_STOCK_ONLINE"):
-                    return True
-                if offers.get("isAvailable") is True:
-                    return True
-            elif isinstance(offers, list) and offers:
-                first = offers[0]
-                if isinstance(first, dict):
-                    av = first.get("availability") or first.get("availabilityStatus")
-                    if isinstance(av, str) and av.upper() in ("IN_STOCK", "INSTOCK", "AVAILABLE"):
-                        return True
-                    if first.get("isAvailable") is True:
-                        return True
-
-            fulfil = item.get("fulfillment") or item.get("fulfillmentInfo") or item.get("fulfillmentOptions")
-            if isinstance(fulfil, dict):
-                if fulfil.get("isAvailable") is True or fulfil.get("isFulfillable") is True:
-                    return True
+        await self._start()
+        async with self._semaphore:
+            context, selected_user_agent = await self._new_context(use_persistent_session)
+            try:
+                return await self._search(context, selected_user_agent, search_term, use_persistent_session)
+            finally:
+                await _safe_close(context)
 
-            # 6) Textual availability messages
-            avail_msg = item.get("availabilityMessage") or item.get("availabilityText") or item.get("availability")
-            if isinstance(avail_msg, str) and any(kw in avail_msg.lower() for kw in ("in stock", "available", "add to cart", "available online")):
-                return True
+    async def scrape_many(self, terms, use_persistent_session=True):
+        """Scrape several terms at once, one context each; results come back in `terms` order."""
+        return await asyncio.gather(*(self.scrape(term, use_persistent_session) for term in terms))
 
-            # 7) If we have price/offer and no explicit out-of-stock, be permissive
-            out_flags = ("OUT_OF_STOCK", "SOLD_OUT", "UNAVAILABLE", "COMING_SOON")
-            if (item.get("priceInfo") or item.get("price") or item.get("offers")) and not (isinstance(status, str) and status.upper() in out_flags):
-                return True
+    async def _results_from_page(self, page):
+        """Wait out any bot check, then build results from the page's __NEXT_DATA__; None on failure."""
+        # --- CAPTCHA DETECTION & WAIT ---
+        outcome = await _wait_for_data_or_captcha(page, timeout=CAPTCHA_TIMEOUT_MS)
+        if outcome == "captcha":
+            if self.headless:
+                print("Walmart served a bot check; rerun without WALMART_HEADLESS=1 to solve it.")
+                return None
+            print("!!! ACTION REQUIRED: Solve the captcha in the browser window !!!")
+            outcome = await _wait_for_data_or_captcha(page, timeout=CAPTCHA_TIMEOUT_MS, watch_captcha=False)
+        script_locator = page.locator("script#__NEXT_DATA__")
+        if outcome == "data":
+            print("Data tag detected! Proceeding with extraction...")
+        else:
+            # The race already watched for the tag; one refresh is the last try
+            print("Timeout: Data tag not found.")
+            print("Attempting page refresh...")
+            await asyncio.sleep(2)
+            try:
+                await page.reload(wait_until="domcontentloaded", timeout=30000)
+                await script_locator.wait_for(state="attached", timeout=20000)
+            except Exception:
+                return None
 
-            # Default: not available
-            return False
+        # Debug runs keep whole items so debug_items.json lists every key
+        item_stacks = await page.evaluate(_ITEM_STACKS_JS, None if DEBUG else _ITEM_FIELDS)
+        if item_stacks is not None:
+            built = await asyncio.to_thread(_build_results_from_stacks, item_stacks)
+        else:
+            # textContent skips inner_text's layout-aware whitespace handling
+            raw_json_str = await script_locator.evaluate("e => e.textContent")
+            built = await asyncio.to_thread(_parse_and_build, raw_json_str)
+        return built
 
-        def _debug_item_details(item: dict):
-            """Print a concise snapshot of selected fields for debugging.
+    async def _search(self, context, selected_user_agent, search_term, use_persistent_session):
+        page = await context.new_page()
+        
+        # NOTE: Stealth patches are applied automatically by rebrowser-playwright.
+        # No need for manual navigator.webdriver overrides or stealth plugins.
+        # The patched Chromium binary handles all anti-detection automatically.
 
-            Avoid dumping huge blobs; show primitive values, dict keys, and list lengths.
-            """
-            def short(v, maxlen=160):
-                try:
-                    if v is None:
-                        return "None"
-                    if isinstance(v, (int, float, bool)):
-                        return str(v)
-                    if isinstance(v, str):
-                        s = v.strip()
-                        return (s[:maxlen] + "...") if len(s) > maxlen else s
-                    if isinstance(v, dict):
-                        keys = list(v.keys())
-                        return f"dict(keys={keys[:8]})"
-                    if isinstance(v, list):
-                        if not v:
-                            return "list(len=0)"
-                        first = v[0]
-                        if isinstance(first, dict):
-                            return f"list(len={len(v)}, first=dict(keys={list(first.keys())[:6]}))"
-                        return f"list(len={len(v)}, first_type={type(first).__name__})"
-                    return repr(v)[:maxlen]
-                except Exception:
-                    return "<error>"
-
-            keys = [
-                "sku", "id", "productId", "name",
-                "availabilityStatus", "isInStock", "isAvailable",
-                "priceInfo", "price", "offers", "inventory", "fulfillment",
-                "availabilityMessage", "availabilityText"
-            ]
-
-            identifier = item.get("sku") or item.get("productId") or item.get("id") or item.get("name")
-            pieces = [f"DebugItem id={identifier!s}"]
-            for k in keys:
-                if k in item:
-                    pieces.append(f"{k}={short(item.get(k))}")
-
-            print(" | ".join(pieces))
-
-        # Navigate to homepage first to establish browsing context
-        try:
-            await _navigate_to_homepage(page)
-        except Exception as e:
-            print(f"Homepage navigation warning: {e}")
-            await asyncio.sleep(2)
+        # A warm session already carries the cookies the homepage visit would set
+        warm = use_persistent_session and _session_is_warm(await self._session_state())
+        if warm:
+            print("Warm session found; skipping homepage visit")
+        else:
+            # Navigate to homepage first to establish browsing context
+            try:
+                await _navigate_to_homepage(page)
+            except Exception as e:
+                print(f"Homepage navigation warning: {e}")
+                await asyncio.sleep(2)
         
         # Now navigate to search with referer
-        url = f"https://www.walmart.ca/search?q={search_term.replace(' ', '%20')}"
+        url = _search_url(search_term)
         
         try:
             print(f"Searching for '{search_term}' (Store #1176 - Cole Harbour)...")
@@ -407,181 +967,133 @@ async def scrape_walmart_cole_harbour(search_term, use_persistent_session=True):
             # Add realistic delay before search
             await asyncio.sleep(random.uniform(2, 4))
             
-            # Navigate to search (referer already set from homepage)
-            await page.goto(url, wait_until="domcontentloaded", timeout=45000)
+            search_response = asyncio.get_running_loop().create_future()
+
+            def on_response(response):
+                if (
+                    not search_response.done()
+                    and _SEARCH_XHR_RE.search(response.url)
+                    and "application/json" in (response.headers.get("content-type") or "")
+                ):
+                    search_response.set_result(response)
+
+            page.on("response", on_response)
+
+            # Navigate to search (referer set by the homepage visit unless warm).
+            # Only wait for the response to commit: the XHR/data-tag race below
+            # decides when there is something to read, so a slow page load
+            # needn't hold it up or fail it.
+            try:
+                await page.goto(url, wait_until="commit", timeout=15000)
+            except PlaywrightTimeoutError:
+                print("Search navigation slow to commit; waiting for the data instead")
             
             # Add more realistic delays and simulate browsing
             await asyncio.sleep(random.uniform(2, 5))
-            await _simulate_human_behavior(page)
-            
-            # --- CAPTCHA DETECTION & WAIT ---
-            for attempt in range(120):  # Increase timeout to 2 minutes
-                try:
-                    content = await page.content()
-                except Exception:
-                    await asyncio.sleep(1)
-                    continue
-                    
-                content_lower = content.lower()
-                
-                is_blocked = any(phrase in content_lower for phrase in [
-                    "press & hold", 
-                    "verify you are human",
-                    "robot or human",
-                    "access to this page has been denied",
-                    "unusual traffic from your computer",
-                    "we detected unusual traffic",
-                ])
-                
-                has_data = await page.locator("script#__NEXT_DATA__").count() > 0
-                
-                if is_blocked and not has_data:
-                    if attempt % 10 == 0:
-                        print(f"!!! ACTION REQUIRED: Solve the captcha in the browser window !!! (attempt {attempt})")
-                    # Randomize wait time to avoid detection
-                    await asyncio.sleep(random.uniform(1.5, 3))
-                elif has_data:
-                    print("Data tag detected! Proceeding with extraction...")
-                    break
-                else:
-                    # Random micro-delays to seem more human
-                    await asyncio.sleep(random.uniform(0.5, 1.5))
-
-            script_locator = page.locator("script#__NEXT_DATA__")
+            await _simulate_human_behavior(page, brief=warm)
             
+            # Client-side searches arrive as a JSON XHR; server-rendered ones as the
+            # __NEXT_DATA__ tag. Take whichever yields products first.
+            dom_wait = asyncio.ensure_future(self._results_from_page(page))
             try:
-                await script_locator.wait_for(state="attached", timeout=20000)
-            except Exception as e:
-                print(f"Timeout: Data tag not found. Error: {e}")
-                # Try one more refresh before giving up
-                print("Attempting page refresh...")
-                await asyncio.sleep(2)
-                try:
-                    await page.reload(wait_until="domcontentloaded", timeout=30000)
-                    await asyncio.sleep(3)
-                    if await page.locator("script#__NEXT_DATA__").count() == 0:
-                        await _safe_close(context, browser)
-                        return []
-                except Exception:
-                    await _safe_close(context, browser)
-                    return []
-
-            raw_json_str = await script_locator.inner_text()
-
-            data = None
-            try:
-                data = json.loads(raw_json_str)
-            except Exception:
-                start = raw_json_str.find('{')
-                end = raw_json_str.rfind('}')
-                if start != -1 and end != -1:
+                await asyncio.wait({search_response, dom_wait}, return_when=asyncio.FIRST_COMPLETED)
+                built = None
+                if search_response.done():
                     try:
-                        data = json.loads(raw_json_str[start:end+1])
-                    except: 
-                        data = None
+                        body = await search_response.result().body()
+                        built = await asyncio.to_thread(_results_from_search_json, body)
+                    except Exception as e:
+                        print(f"Could not use search XHR response: {e}")
+                if built is not None and built[0]:
+                    print("Search XHR captured! Skipping the page data tag.")
+                    dom_wait.cancel()
+                else:
+                    built = await dom_wait
+            finally:
+                page.remove_listener("response", on_response)
+                if not dom_wait.done():
+                    dom_wait.cancel()
+                await asyncio.gather(dom_wait, return_exceptions=True)
 
-            if not isinstance(data, dict):
-                print(f"Error: Parsed data is {type(data)}.")
-                await _safe_close(context, browser)
+            if built is None:
                 return []
-
-            try:
-                props = data.get('props', {})
-                page_props = props.get('pageProps', {})
-                initial_data = page_props.get('initialData', {})
-                search_result = initial_data.get('searchResult', {})
-                item_stacks = search_result.get('itemStacks', [])
-                
-                if not item_stacks:
-                    print("No product stacks found.")
-                    await _safe_close(context, browser)
-                    return []
-
-                items = []
-                for stack in item_stacks:
-                    items.extend(stack.get('items', []))
-                    
-            except Exception as e:
-                print(f"JSON structure error: {e}")
-                await _safe_close(context, browser)
-                return []
-            
-            results = []
-            debug_items = []
-            for item in items:
-                if not isinstance(item, dict) or item.get("__typename") != "Product":
-                    continue
-                
-                name = item.get("name")
-                price, unit_price = _extract_price_and_unit(item)
-                available = _extract_availability(item)
-                quantity = _extract_quantity(item)
-
-                # If price still missing, emit a concise debug line to help diagnose structure
-                identifier = item.get("sku") or item.get("productId") or item.get("id") or name
-                if price is None:
-                    print(f"Debug: missing price for {identifier!s}; keys: {sorted(list(item.keys()))}")
-
-                results.append({
-                    "name": name,
-                    "price": price,
-                    "unit_price": unit_price,
-                    "quantity": quantity,
-                    "available": available
-                })
-                # Collect a small debug summary (no large payloads)
-                try:
-                    debug_items.append({
-                        "identifier": identifier,
-                        "name": name,
-                        "keys": sorted(list(item.keys())),
-                        "price": price,
-                        "unit_price": unit_price,
-                        "availabilityStatus": item.get("availabilityStatus"),
-                        "offers_present": isinstance(item.get("offers") or item.get("offer"), (dict, list)),
-                        "inventory_present": bool(item.get("inventory") or item.get("inventoryInfo") or item.get("inStoreAvailability")),
-                        "availabilityMessage": item.get("availabilityMessage") or item.get("availabilityText") or item.get("availability")
-                    })
-                except Exception:
-                    pass
-
-            print(f"Successfully retrieved {len(results)} items.")
+            results, debug_items = built
             
             # Simulate more browsing before leaving
-            await _simulate_human_behavior(page)
+            await _simulate_human_behavior(page, brief=warm)
             await asyncio.sleep(random.uniform(1, 3))
             
-            # Write debug summaries to a file for inspection
-            try:
-                with open("debug_items.json", "w", encoding="utf-8") as df:
-                    json.dump(debug_items, df, indent=2, ensure_ascii=False)
-                print("Wrote per-item debug summary to debug_items.json")
-            except Exception as e:
-                print(f"Failed to write debug file: {e}")
+            await _debug_dump("debug_items.json", debug_items)
             
             # Save session state for reuse
             if use_persistent_session:
                 try:
-                    storage_state = await context.storage_state()
-                    session_file = SESSION_DIR / "walmart_session.json"
-                    with open(session_file, 'w') as f:
-                        json.dump(storage_state, f)
+                    # Writes SESSION_FILE and hands back the same state, so the
+                    # next context starts from it without reading the file again
+                    storage_state = await context.storage_state(path=str(SESSION_FILE))
+                    self._storage_state = storage_state
                     print("Saved browser session for future use")
                 except Exception as e:
                     print(f"Could not save session: {e}")
             
-            await _safe_close(context, browser)
             return results
 
         except Exception as e:
-            print(f"Scraper Error: {e}")
-            traceback.print_exc()
-            await _safe_close(context, browser)
+            print(f"Scraper Error: {type(e).__name__}: {e}")
+            # Full traces only on request: a run of rate-limited searches would
+            # otherwise flood the console with near-identical stacks
+            if DEBUG:
+                traceback.print_exc()
             return []
 
+
+_SCRAPER = WalmartScraper(concurrency=MAX_CONTEXTS)
+
+
+async def scrape_walmart_cole_harbour(search_term, use_persistent_session=True):
+    """Scrape Walmart with anti-detection measures.
+    
+    Runs on a shared browser that stays open between calls; call
+    close_walmart() once when done scraping.
+
+    Args:
+        search_term: Product search query
+        use_persistent_session: If True, reuse browser session/cookies
+    """
+    return await _SCRAPER.scrape(search_term, use_persistent_session)
+
+
+async def scrape_walmart_many(terms, concurrency=RATE_LIMIT_BURST):
+    """
+    Scrape several search terms concurrently, each in its own context on the
+    shared browser. Results are returned in the same order as `terms`.
+    The first RATE_LIMIT_BURST searches (one by default) start together; the
+    rest are paced MIN_REQUEST_INTERVAL apart.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(term):
+        async with semaphore:
+            return await scrape_walmart_cole_harbour(term)
+
+    return await asyncio.gather(*(one(term) for term in terms))
+
+
+async def close_walmart():
+    """Close the shared Walmart browser; call once when done scraping."""
+    await _SCRAPER.close()
+
+
 if __name__ == "__main__":
     search_query = "great value milk"
-    res = asyncio.run(scrape_walmart_cole_harbour(search_query))
+
+    async def _run_once():
+        try:
+            return await scrape_walmart_cole_harbour(search_query)
+        finally:
+            await close_walmart()
+
+    res = asyncio.run(_run_once())
     if res:
         print(f"\nResults for '{search_query}' at Cole Harbour:")
         for r in res[:10]: 